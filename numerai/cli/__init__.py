@@ -3,6 +3,7 @@ from colorama import init
 
 from numerai.cli import (
     constants,
+    deploy_all,
     destroy_all,
     doctor,
     node,
@@ -36,5 +37,6 @@ def main():
     numerai.add_command(misc.copy_example)
     numerai.add_command(misc.list_constants)
     numerai.add_command(misc.add_volume_aws)
+    numerai.add_command(deploy_all.deploy_all)
     numerai.add_command(destroy_all.destroy_all)
     numerai()
@@ -9,8 +9,18 @@ CONFIG_PATH = os.path.join(str(Path.home()), ".numerai")
 KEYS_PATH = os.path.join(CONFIG_PATH, ".keys")
 GCP_KEYS_PATH = os.path.join(CONFIG_PATH, ".gcp_keys")
 NODES_PATH = os.path.join(CONFIG_PATH, "nodes.json")
+TOURNAMENTS_PATH = os.path.join(CONFIG_PATH, "tournaments.json")
+LOGS_PATH = os.path.join(CONFIG_PATH, "logs")
+REGISTRY_LOGINS_PATH = os.path.join(CONFIG_PATH, "registry_logins.json")
+TF_PLUGIN_CACHE_PATH = os.path.join(CONFIG_PATH, "terraform-plugins")
+TF_INIT_PATH = os.path.join(CONFIG_PATH, "terraform_init.json")
+# hashicorp/terraform image every terraform command runs in
+TERRAFORM_VERSION = "1.5.6"
 TERRAFORM_PATH = os.path.join(PACKAGE_PATH, "..", "terraform")
+# view of NODES_PATH with only one provider's nodes, inside that provider's terraform dir
+PROVIDER_NODES_FILE = "nodes.json"
 EXAMPLE_PATH = os.path.join(PACKAGE_PATH, "..", "examples")
+BASE_IMAGE_PATH = os.path.join(PACKAGE_PATH, "..", "base-image")
 
 EXAMPLES = os.listdir(EXAMPLE_PATH)
 
@@ -19,10 +29,58 @@ PROVIDER_AZURE = "azure"
 PROVIDER_GCP = "gcp"
 PROVIDERS = [PROVIDER_AWS, PROVIDER_AZURE, PROVIDER_GCP]
 
+# used for help text until the tournament list has been cached locally
+DEFAULT_TOURNAMENTS = {8: "numerai", 11: "signals", 12: "crypto"}
+TOURNAMENTS_CACHE_TTL_HOURS = 24
+
+# bytes of each subprocess stream kept in memory, older output spills to LOGS_PATH
+OUTPUT_TAIL_BYTES = 4 * 1024 * 1024
+
+# image label recording the fingerprint of the sources an image was built from
+SOURCE_FINGERPRINT_LABEL = "ai.numer.source-fingerprint"
+
+# tag in each node's repo holding its BuildKit layer cache, see `deploy --registry-cache`
+BUILD_CACHE_TAG = "buildcache"
+# buildx builder used for registry caching, the default docker driver can't export caches
+BUILDX_BUILDER = "numerai-cli"
+
+# shared image holding the examples' requirements, pushed once to each registry
+BASE_IMAGE_NAME = "numerai-base"
+# build arg through which Dockerfiles opt into building on the base image
+BASE_IMAGE_ARG = "BASE_IMAGE"
+
+# how long a docker registry login is reused when the registry doesn't say
+LOGIN_TTL_SECONDS = 12 * 60 * 60
+# logins expiring sooner than this are renewed instead of reused
+LOGIN_EXPIRY_MARGIN_SECONDS = 5 * 60
+
 LOG_TYPE_WEBHOOK = "webhook"
 LOG_TYPE_CLUSTER = "cluster"
 LOG_TYPES = [LOG_TYPE_WEBHOOK, LOG_TYPE_CLUSTER]
 
+# node monitoring gives up after this long
+MONITOR_TIMEOUT_SECONDS = 15 * 60
+# monitoring polls quickly at first and backs off up to the max interval
+MONITOR_POLL_INITIAL_SECONDS = 1
+MONITOR_POLL_MAX_SECONDS = 15
+MONITOR_POLL_BACKOFF = 1.5
+# how long to keep looking for logs of a job that finished without any
+MONITOR_LOG_GRACE_SECONDS = 2 * 60
+# how long the storage account resolved for monitoring an Azure node is reused
+AZURE_MONITOR_SESSION_TTL_SECONDS = 24 * 60 * 60
+
+# where the digest of the last applied node settings is kept in nodes.json
+APPLIED_CONFIG_KEY = "applied_config"
+# where the Azure monitoring session of a node is cached in nodes.json
+AZURE_MONITOR_SESSION_KEY = "azure_monitor_session"
+# node settings that never reach the cloud resources
+LOCAL_NODE_KEYS = [
+    "path",
+    "source_fingerprint",
+    APPLIED_CONFIG_KEY,
+    AZURE_MONITOR_SESSION_KEY,
+]
+
 SIZE_PRESETS = {
     # balanced cpu/mem
     "gen-xs": (512, 2048),
@@ -55,6 +113,7 @@ DEFAULT_SIZE_GCP = "cpu-md"
 DEFAULT_PROVIDER = PROVIDER_AWS
 DEFAULT_PATH = os.getcwd()
 DEFAULT_TIMEOUT_MINUTES = 60
+DEFAULT_DEPLOY_CONCURRENCY = 4
 DEFAULT_SETTINGS = {
     "provider": DEFAULT_PROVIDER,
     "cpu": SIZE_PRESETS[DEFAULT_SIZE][0],
@@ -71,6 +130,7 @@ KEYS_PATH: {KEYS_PATH}
 NODES_PATH: {NODES_PATH}
 TERRAFORM_PATH: {TERRAFORM_PATH}
 EXAMPLE_PATH: {EXAMPLE_PATH}
+BASE_IMAGE_PATH: {BASE_IMAGE_PATH}
 
 ---Cloud Interaction---
 PROVIDERS: {PROVIDERS}
@@ -0,0 +1,128 @@
+"""Deploy-all command for Numerai CLI"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+import click
+
+from numerai.cli.constants import *
+from numerai.cli.node.deploy import DEPLOY_STEPS, deploy_node
+from numerai.cli.util import docker
+from numerai.cli.util.files import load_or_init_nodes
+
+
+@click.command("deploy-all")
+@click.option(
+    "--models",
+    "-m",
+    type=str,
+    help="Comma separated names of the nodes to deploy, as listed in nodes.json "
+    "(e.g. numerai-my_model,signals-my_model). Defaults to every configured node.",
+)
+@click.option(
+    "--concurrency",
+    "-j",
+    type=click.IntRange(min=1),
+    default=DEFAULT_DEPLOY_CONCURRENCY,
+    help=f"How many nodes to build and push at the same time. "
+    f"Defaults to {DEFAULT_DEPLOY_CONCURRENCY}.",
+)
+@click.option(
+    "--force",
+    "-f",
+    is_flag=True,
+    help="Build and push even if a node's sources haven't changed since its last deploy.",
+)
+@click.option(
+    "--registry-cache",
+    "-c",
+    is_flag=True,
+    help="Import and export each node's docker build cache from/to its registry.",
+)
+@click.option("--verbose", "-v", is_flag=True)
+def deploy_all(models, concurrency, force, registry_cache, verbose):
+    """
+    Builds and pushes the docker images of several Prediction Nodes in parallel.
+
+    Output from each node is prefixed with its name, and a summary of
+    per-node timings and failures is printed at the end.
+    """
+    nodes_config = load_or_init_nodes()
+    if models:
+        nodes = [name.strip() for name in models.split(",") if name.strip()]
+        unknown = [node for node in nodes if node not in nodes_config]
+        if unknown:
+            click.secho(
+                f"Nodes {unknown} are not configured, "
+                f"configured nodes are: {list(nodes_config)}",
+                fg="red",
+            )
+            exit(1)
+    else:
+        nodes = list(nodes_config)
+
+    if len(nodes) == 0:
+        click.secho("No nodes to deploy", fg="yellow")
+        return
+
+    login_lock = Lock()
+
+    def deploy_one(node):
+        timings = {}
+        start = time.time()
+        with docker.log_prefix(f"[{node}] "):
+            try:
+                deployed = deploy_node(
+                    node,
+                    nodes_config[node],
+                    verbose,
+                    timings,
+                    login_lock,
+                    force,
+                    registry_cache,
+                )
+                error = None
+            except click.ClickException as e:
+                error = e.format_message()
+            except SystemExit:
+                error = "aborted, see the output above"
+            except Exception as e:
+                error = str(e)
+        timings["total"] = time.time() - start
+        if error is not None:
+            status = "failed"
+            click.secho(f"[{node}] failed: {error}", fg="red")
+        elif deployed:
+            status = "ok"
+            click.secho(f"[{node}] deployed", fg="green")
+        else:
+            status = "skipped"
+            click.secho(f"[{node}] unchanged, skipped", fg="green")
+        return node, status, timings, error
+
+    click.echo(f"deploying {len(nodes)} node(s), {concurrency} at a time...")
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(deploy_one, nodes))
+
+    print_summary(results)
+    failed = [node for node, status, _, _ in results if status == "failed"]
+    if failed:
+        click.secho(f"{len(failed)} node(s) failed to deploy: {failed}", fg="red")
+        exit(1)
+    click.secho("Prediction Nodes deployed. Next: test your nodes.", fg="green")
+
+
+def print_summary(results):
+    columns = DEPLOY_STEPS + ["total"]
+    width = max(len("node"), *(len(node) for node, _, _, _ in results))
+    click.echo(
+        f"\n{'node':<{width}}  {'status':<7}"
+        + "".join(f"  {column:>8}" for column in columns)
+    )
+    for node, status, timings, _ in results:
+        row = f"{node:<{width}}  {status:<7}"
+        for column in columns:
+            cell = f"{timings[column]:.1f}s" if column in timings else "-"
+            row += f"  {cell:>8}"
+        click.secho(row, fg="red" if status == "failed" else "green")
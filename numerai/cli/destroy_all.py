@@ -1,11 +1,15 @@
 """Destroy command for Numerai CLI"""
 
 import click
-from numerapi import base_api
 
 from numerai.cli.constants import *
-from numerai.cli.util.docker import terraform
-from numerai.cli.util.files import load_or_init_nodes, store_config, copy_file
+from numerai.cli.util.terraform import terraform_providers
+from numerai.cli.util.files import (
+    backup_nodes,
+    load_or_init_nodes,
+    locked_nodes,
+    without_applied_config,
+)
 from numerai.cli.util.keys import get_provider_keys, get_numerai_keys
 
 
@@ -31,7 +35,12 @@ def destroy_all(ctx, verbose, preserve_node_config):
     ):
         exit(0)
 
-    nodes_config = load_or_init_nodes()
+    # nodes.json is restored after their resources were (partly) destroyed,
+    # so the restored configs must not claim to have been applied
+    nodes_config = {
+        node: without_applied_config(node_config)
+        for node, node_config in load_or_init_nodes().items()
+    }
 
     if len(nodes_config) == 0:
         click.secho("No nodes to destroy", fg="green")
@@ -50,27 +59,28 @@ def destroy_all(ctx, verbose, preserve_node_config):
         return
 
     click.secho("backing up nodes.json and deleting current config...")
-    copy_file(NODES_PATH, f"{NODES_PATH}.backup", force=True, verbose=True)
-    store_config(NODES_PATH, {})
+    backup_nodes(nodes_config)
+    with locked_nodes() as stored_nodes:
+        stored_nodes.clear()
 
     try:
         click.secho(f"destroying nodes...")
-        for provider, provider_keys in provider_keys.items():
-            click.secho(f"deleting cloud resources for {provider}...")
-            terraform(
-                "destroy -auto-approve",
-                verbose,
-                provider,
-                env_vars=provider_keys,
-                inputs={"node_config_file": "../nodes.json"},
-            )
+        terraform_providers(
+            "destroy -auto-approve",
+            provider_keys,
+            verbose,
+            "deleting cloud resources for",
+        )
 
     except Exception as e:
         click.secho(e.__str__(), fg="red")
         click.secho("restoring nodes.json...", fg="green")
-        store_config(NODES_PATH, nodes_config)
+        with locked_nodes() as stored_nodes:
+            stored_nodes.update(nodes_config)
         return
 
+    from numerapi import base_api
+
     napi = base_api.Api(*get_numerai_keys())
     for node, node_config in nodes_config.items():
         if "model_id" in node_config and "webhook_url" in node_config:
@@ -83,4 +93,5 @@ def destroy_all(ctx, verbose, preserve_node_config):
 
     if preserve_node_config:
         click.secho("restoring nodes.json...", fg="green")
-        store_config(NODES_PATH, nodes_config)
+        with locked_nodes() as stored_nodes:
+            stored_nodes.update(nodes_config)
@@ -5,12 +5,12 @@ import sys
 from urllib import request
 import click
 
+from numerai.cli.constants import PROVIDER_AWS, PROVIDER_AZURE
+from numerai.cli.providers import get_provider
 from numerai.cli.util.files import load_or_init_nodes
 from numerai.cli.util.debug import is_win8, is_win10
 from numerai.cli.util.keys import (
-    check_aws_validity,
     check_numerai_validity,
-    check_azure_validity,
     get_numerai_keys,
     get_aws_keys,
     get_azure_keys,
@@ -98,12 +98,12 @@ def doctor():
         invalid_providers.append("numerai")
     if "aws" in used_providers:
         try:
-            check_aws_validity(*get_aws_keys())
+            get_provider(PROVIDER_AWS).check_validity(*get_aws_keys())
         except:
             invalid_providers.append("aws")
     if "azure" in used_providers:
         try:
-            check_azure_validity(*get_azure_keys())
+            get_provider(PROVIDER_AZURE).check_validity(*get_azure_keys())
         except:
             invalid_providers.append("azure")
 
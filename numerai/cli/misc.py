@@ -1,3 +1,5 @@
+import copy
+
 from numerai.cli.constants import *
 from numerai.cli.util import files
 from numerai.cli.util.terraform import apply_terraform
@@ -82,18 +84,18 @@ def add_volume_aws(size, verbose):
     """
     click.secho("Setting volume size for AWS nodes...", fg="yellow")
     # get nodes config object
-    nodes_config = files.load_or_init_nodes()
-    print(nodes_config)
-    # set volume size for all nodes to same size
-    for node in nodes_config:
-        nodes_config[node]["volume"] = size
-    files.store_config(NODES_PATH, nodes_config)
-    files.copy_file(
-        NODES_PATH,
-        f"{CONFIG_PATH}/{PROVIDER_AWS}/",
-        force=True,
+    with files.locked_nodes() as nodes_config:
+        previous_nodes_config = copy.deepcopy(nodes_config)
+        # set volume size for all nodes to same size
+        for node in nodes_config:
+            nodes_config[node]["volume"] = size
+    click.secho(f"Applying terraform to add {size} GB volume...", fg="yellow")
+    apply_terraform(
+        nodes_config,
+        [PROVIDER_AWS],
+        PROVIDER_AWS,
         verbose=verbose,
+        previous_nodes_config=previous_nodes_config,
+        changed_nodes=list(nodes_config),
     )
-    click.secho(f"Applying terraform to add {size} GB volume...", fg="yellow")
-    apply_terraform(nodes_config, [PROVIDER_AWS], PROVIDER_AWS, verbose=verbose)
     click.secho("Volume size updated successfully!", fg="green")
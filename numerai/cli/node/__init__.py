@@ -2,30 +2,91 @@
 
 import json
 import logging
-import click
+import time
+from threading import Thread
 
-from numerapi import base_api
+import click
 
 from numerai.cli.constants import *
 from numerai.cli.node.config import config
 from numerai.cli.node.deploy import deploy
 from numerai.cli.node.destroy import destroy
 from numerai.cli.node.test import test, status
+from numerai.cli.util.files import load_config, store_config
 from numerai.cli.util.keys import get_numerai_keys
 
 # Setting azure's logging level "ERROR" to avoid spamming the terminal
 
 
-def tournaments_dict():
+def fetch_tournaments():
+    from numerapi import base_api
+
     napi = base_api.Api()
     tournaments = napi.raw_query('query { tournaments { name tournament } }')
     return {t["tournament"]: t["name"] for t in tournaments["data"]["tournaments"]}
 
 
+def load_cached_tournaments():
+    """
+    Returns (tournaments, is_stale) from the local tournament cache,
+    or (None, True) if nothing has been cached yet. Never touches the network.
+    """
+    try:
+        cache = load_config(TOURNAMENTS_PATH)
+        tournaments = {int(t): name for t, name in cache["tournaments"].items()}
+        age = time.time() - cache["updated_at"]
+    except (OSError, ValueError, KeyError, AttributeError):
+        return None, True
+    return tournaments, age > TOURNAMENTS_CACHE_TTL_HOURS * 3600
+
+
+def refresh_tournaments():
+    tournaments = fetch_tournaments()
+    if os.path.exists(CONFIG_PATH):
+        store_config(
+            TOURNAMENTS_PATH, {"updated_at": time.time(), "tournaments": tournaments}
+        )
+    return tournaments
+
+
+def refresh_tournaments_in_background():
+    def _refresh():
+        try:
+            refresh_tournaments()
+        except Exception:
+            # a failed background refresh just leaves the old cache in place
+            pass
+
+    Thread(target=_refresh, daemon=True).start()
+
+
+def tournaments_dict():
+    """
+    Tournament number -> name. Served from the local cache when possible;
+    a stale cache is refreshed in the background, a missing one synchronously.
+    """
+    tournaments, is_stale = load_cached_tournaments()
+    if tournaments is None:
+        return refresh_tournaments()
+    if is_stale:
+        refresh_tournaments_in_background()
+    return tournaments
+
+
+def tournaments_help():
+    tournaments, _ = load_cached_tournaments()
+    return json.dumps(tournaments or DEFAULT_TOURNAMENTS, indent=2)
+
+
 def get_models(tournament):
+    from numerapi import base_api
+
     napi = base_api.Api(*get_numerai_keys())
     models = napi.get_models(tournament)
-    name_prefix = tournaments_dict()[tournament]
+    tournaments = tournaments_dict()
+    if tournament not in tournaments:
+        tournaments = refresh_tournaments()
+    name_prefix = tournaments[tournament]
     model_dict = {}
     for model_name, model_id in models.items():
         model_dict[model_name] = {
@@ -52,7 +113,7 @@ def get_models(tournament):
     default=8,
     help="Target a specific tournament number."
     " Defaults to Numerai Tournament/Classic."
-    f" Available tournaments: {json.dumps(tournaments_dict(), indent=2)}",
+    f" Available tournaments: {tournaments_help()}",
 )
 @click.pass_context
 def node(ctx, verbose, model_name, tournament):
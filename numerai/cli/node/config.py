@@ -1,8 +1,8 @@
 """Config command for Numerai CLI"""
 
+import copy
 import os
 
-from numerapi import base_api
 from numerai.cli.constants import (
     DEFAULT_PROVIDER,
     DEFAULT_SIZE_GCP,
@@ -14,19 +14,19 @@ from numerai.cli.constants import (
     DEFAULT_SETTINGS,
     DEFAULT_PATH,
     SIZE_PRESETS,
-    NODES_PATH,
-    CONFIG_PATH,
     PROVIDER_GCP,
+    APPLIED_CONFIG_KEY,
 )
 from numerai.cli.util import docker
 from numerai.cli.util.files import (
     load_or_init_nodes,
-    store_config,
+    set_node,
+    update_node,
     copy_example,
-    copy_file,
 )
 from numerai.cli.util.keys import get_provider_keys, get_numerai_keys
 from numerai.cli.util.terraform import (
+    applied_config_digest,
     apply_terraform,
     create_azure_registry,
     create_gcp_registry,
@@ -135,6 +135,7 @@ def config(
     # get nodes config object and set defaults for this node
     click.secho(f'configuring node "{node}"...')
     nodes_config = load_or_init_nodes()
+    previous_nodes_config = copy.deepcopy(nodes_config)
     nodes_config.setdefault(node, {})
 
     using_defaults = False
@@ -233,16 +234,23 @@ def config(
 
     # double check there is a dockerfile in the path we are about to configure
     docker.check_for_dockerfile(nodes_config[node]["path"])
-    store_config(NODES_PATH, nodes_config)
-
-    # Added after tf directory restructure: copy nodes.json to providers' tf directory
-    for affected_provider in affected_providers:
-        copy_file(
-            NODES_PATH,
-            f"{CONFIG_PATH}/{affected_provider}/",
-            force=True,
-            verbose=verbose,
+    set_node(node, node_conf)
+
+    if affected_providers == {provider} and node_conf.get(
+        APPLIED_CONFIG_KEY
+    ) == applied_config_digest(node_conf):
+        click.secho(
+            "Node settings unchanged since they were last applied, skipping terraform.",
+            fg="green",
+        )
+        if register_webhook:
+            update_webhook(node_conf, model_id, cron, register_webhook)
+        click.secho(
+            "Prediction Node configured successfully. "
+            "Next: deploy and test your node",
+            fg="green",
         )
+        return
 
     # terraform apply: create cloud resources
     provider_keys = get_provider_keys(node)
@@ -283,11 +291,36 @@ def config(
             docker.push(node_conf["docker_repo"], verbose)
         nodes_config[node] = node_conf
 
-    store_config(NODES_PATH, nodes_config)
+    set_node(node, node_conf)
+    # pick up nodes other CLI runs configured meanwhile
+    nodes_config = load_or_init_nodes()
 
-    apply_terraform(nodes_config, affected_providers, provider, verbose)
+    applied = apply_terraform(
+        nodes_config,
+        affected_providers,
+        provider,
+        verbose,
+        previous_nodes_config=previous_nodes_config,
+        changed_nodes=[node],
+    )
+
+    update_webhook(nodes_config[node], model_id, cron, register_webhook)
+
+    if applied:
+        update_node(
+            node, {APPLIED_CONFIG_KEY: applied_config_digest(nodes_config[node])}
+        )
+
+    click.secho(
+        "Prediction Node configured successfully. " "Next: deploy and test your node",
+        fg="green",
+    )
+
+
+def update_webhook(node_conf, model_id, cron, register_webhook):
+    webhook_url = node_conf["webhook_url"]
+    from numerapi import base_api
 
-    webhook_url = nodes_config[node]["webhook_url"]
     napi = base_api.Api(*get_numerai_keys())
     if not cron or register_webhook:
         click.echo(f"registering webhook {webhook_url} for model {model_id}...")
@@ -296,8 +329,3 @@ def config(
     else:
         click.echo(f"removing registered webhook for model {model_id}...")
         napi.set_submission_webhook(model_id, None)
-
-    click.secho(
-        "Prediction Node configured successfully. " "Next: deploy and test your node",
-        fg="green",
-    )
@@ -1,30 +1,133 @@
 """Deploy command for Numerai CLI"""
+import os
+import time
+from contextlib import nullcontext
+
 import click
 from numerai.cli.util import files, docker
 
+DEPLOY_STEPS = ["login", "base", "build", "push", "cleanup"]
+
+
+def deploy_node(
+    node,
+    node_config,
+    verbose,
+    timings=None,
+    login_lock=None,
+    force=False,
+    registry_cache=False,
+):
+    """
+    Builds, pushes and cleans up the docker image of one node.
+
+    Build and push are skipped when the registry already holds an image built
+    from identical sources (same source fingerprint), unless `force` is set.
+    Records the seconds spent in each of DEPLOY_STEPS into `timings`, so partial
+    timings survive a failed step. Returns False if the deploy was skipped.
+    """
+    timings = {} if timings is None else timings
+    prefix = docker.get_log_prefix()
+
+    def login(invalidate=False):
+        # docker login rewrites ~/.docker/config.json, don't race other nodes on it
+        with login_lock or nullcontext():
+            if invalidate:
+                docker.invalidate_login(node_config)
+            docker.login(node_config, verbose)
+
+    def push():
+        try:
+            docker.push(node_config["docker_repo"], verbose)
+        except click.ClickException:
+            # the cached registry login may have been revoked, log in again and retry
+            login(invalidate=True)
+            docker.push(node_config["docker_repo"], verbose)
+
+    def run_step(step, message, func):
+        click.echo(f"{prefix}{message}")
+        start = time.time()
+        func()
+        timings[step] = time.time() - start
+
+    docker.check_for_dockerfile(node_config["path"])
+    fingerprint = docker.source_fingerprint(node_config, node)
+
+    run_step("login", "logging into container registry...", login)
+
+    if (
+        not force
+        and node_config.get("source_fingerprint") == fingerprint
+        and docker.remote_source_fingerprint(node_config["docker_repo"], verbose)
+        == fingerprint
+    ):
+        click.secho(
+            f"{prefix}sources unchanged since the last deploy, "
+            f"skipping build and push (use --force to rebuild)",
+            fg="yellow",
+        )
+        return False
+
+    if files.uses_base_image(os.path.join(node_config["path"], "Dockerfile")):
+        run_step(
+            "base",
+            "making sure the shared base image is in the registry...",
+            lambda: docker.push_base_image(node_config, verbose),
+        )
+
+    run_step(
+        "build",
+        "building container image (this may take several minutes)...",
+        lambda: docker.build(
+            node_config,
+            node,
+            verbose,
+            fingerprint=fingerprint,
+            registry_cache=registry_cache,
+        ),
+    )
+    run_step(
+        "push",
+        "pushing image to registry (this may take several minutes)...",
+        push,
+    )
+
+    files.update_node(node, {"source_fingerprint": fingerprint})
+    node_config["source_fingerprint"] = fingerprint
+
+    run_step(
+        "cleanup",
+        "cleaning up local images...",
+        lambda: docker.cleanup(node_config),
+    )
+    return True
+
 
 @click.command()
 @click.option("--verbose", "-v", is_flag=True)
+@click.option(
+    "--force",
+    "-f",
+    is_flag=True,
+    help="Build and push even if the sources haven't changed since the last deploy.",
+)
+@click.option(
+    "--registry-cache",
+    "-c",
+    is_flag=True,
+    help="Import and export the docker build cache from/to your node's registry, "
+    "so builds on fresh machines don't reinstall unchanged dependencies.",
+)
 @click.pass_context
-def deploy(ctx, verbose):
+def deploy(ctx, verbose, force, registry_cache):
     """Builds and pushes your docker image to the AWS ECR / Azure ACR repo"""
     ctx.ensure_object(dict)
     model = ctx.obj["model"]
     node = model["name"]
     node_config = files.load_or_init_nodes(node)
 
-    docker.check_for_dockerfile(node_config["path"])
-
-    click.echo("building container image (this may take several minutes)...")
-    docker.build(node_config, node, verbose)
-
-    click.echo("logging into container registry...")
-    docker.login(node_config, verbose)
-
-    click.echo("pushing image to registry (this may take several minutes)...")
-    docker.push(node_config["docker_repo"], verbose)
-
-    click.echo("cleaning up local images...")
-    docker.cleanup(node_config)
+    deploy_node(
+        node, node_config, verbose, force=force, registry_cache=registry_cache
+    )
 
     click.secho("Prediction Node deployed. Next: test your node.", fg="green")
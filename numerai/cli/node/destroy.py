@@ -1,11 +1,18 @@
 """Destroy command for Numerai CLI"""
 
+import copy
+
 import click
-from numerapi import base_api
 
 from numerai.cli.constants import *
-from numerai.cli.util.docker import terraform
-from numerai.cli.util.files import load_or_init_nodes, store_config, copy_file
+from numerai.cli.util.terraform import targeted_addresses, terraform_providers
+from numerai.cli.util.files import (
+    backup_nodes,
+    load_or_init_nodes,
+    remove_node,
+    set_node,
+    without_applied_config,
+)
 from numerai.cli.util.keys import get_provider_keys, get_numerai_keys
 
 
@@ -32,7 +39,9 @@ def destroy(ctx, preserve_node_config, verbose):
 
     try:
         nodes_config = load_or_init_nodes()
-        node_config = nodes_config[node]
+        # the node's resources are (partly) gone once this runs, so a config
+        # put back below must not claim to have been applied
+        node_config = without_applied_config(nodes_config[node])
         provider_keys = get_provider_keys(node)
         provider = node_config["provider"]
     except (KeyError, FileNotFoundError) as e:
@@ -45,7 +54,7 @@ def destroy(ctx, preserve_node_config, verbose):
 
     if not preserve_node_config:
         click.secho("backing up nodes.json...")
-        copy_file(NODES_PATH, f"{NODES_PATH}.backup", force=True, verbose=True)
+        backup_nodes(nodes_config)
 
     try:
         click.secho(
@@ -53,25 +62,31 @@ def destroy(ctx, preserve_node_config, verbose):
             + (" (temporarily)" if preserve_node_config else "")
             + "..."
         )
+        previous_nodes_config = copy.deepcopy(nodes_config)
         del nodes_config[node]
-        store_config(NODES_PATH, nodes_config)
+        remove_node(node)
 
         click.secho("deleting cloud resources for node...")
-        terraform(
+        terraform_providers(
             "apply -auto-approve",
+            {provider: provider_keys},
             verbose,
-            provider,
-            env_vars=provider_keys,
-            inputs={"node_config_file": "../nodes.json"},
+            "deleting node resources in",
+            {
+                provider: targeted_addresses(
+                    provider, [node], previous_nodes_config, nodes_config
+                )
+            },
         )
 
     except Exception as e:
         click.secho(e.__str__(), fg="red")
-        nodes_config[node] = node_config
-        store_config(NODES_PATH, nodes_config)
+        set_node(node, node_config)
         return
 
     if "model_id" in node_config and "webhook_url" in node_config:
+        from numerapi import base_api
+
         napi = base_api.Api(*get_numerai_keys())
         model_id = node_config["model_id"]
         webhook_url = node_config["webhook_url"]
@@ -82,5 +97,4 @@ def destroy(ctx, preserve_node_config, verbose):
 
     if preserve_node_config:
         click.secho("re-adding node config to nodes.json...", fg="green")
-        nodes_config[node] = node_config
-        store_config(NODES_PATH, nodes_config)
+        set_node(node, node_config)
@@ -0,0 +1,28 @@
+"""
+Provider specific implementations (registry login/cleanup, key validation and
+node monitoring). Each provider lives in its own module so that only the cloud
+SDK for the provider actually in use gets imported.
+"""
+
+import importlib
+
+from numerai.cli.constants import PROVIDER_AWS, PROVIDER_AZURE, PROVIDER_GCP
+
+PROVIDER_MODULES = {
+    PROVIDER_AWS: "numerai.cli.providers.aws",
+    PROVIDER_AZURE: "numerai.cli.providers.azure",
+    PROVIDER_GCP: "numerai.cli.providers.gcp",
+}
+
+
+def get_provider(provider):
+    """
+    Returns the module implementing `provider`, importing it on first use.
+    Every provider module exposes login, registry_url, ensure_repository,
+    cleanup, check_validity and monitor.
+    """
+    try:
+        module_name = PROVIDER_MODULES[provider]
+    except KeyError:
+        raise ValueError(f"Unsupported provider: '{provider}'")
+    return importlib.import_module(module_name)
@@ -0,0 +1,331 @@
+"""AWS implementation of the provider specific CLI operations"""
+
+import base64
+from datetime import datetime, timedelta, timezone
+
+import boto3
+import botocore
+import click
+
+from numerai.cli.constants import *
+from numerai.cli.util.debug import exception_with_msg
+from numerai.cli.util.keys import get_aws_keys
+from numerai.cli.util.monitor import LogCursor, Probe, watch
+
+# log reads resume this far (in ms) behind the newest event, for events ingested late
+LOG_OVERLAP_MS = 30 * 1000
+# how far back webhook logs are looked up when not following a task
+WEBHOOK_LOG_LOOKBACK = timedelta(days=1)
+
+
+def login(node_config):
+    aws_public, aws_secret = get_aws_keys()
+    ecr_client = boto3.client(
+        "ecr",
+        region_name="us-east-1",
+        aws_access_key_id=aws_public,
+        aws_secret_access_key=aws_secret,
+    )
+
+    token = ecr_client.get_authorization_token()  # TODO: use registryIds
+    auth_data = token["authorizationData"][0]
+    username, password = (
+        base64.b64decode(auth_data["authorizationToken"]).decode().split(":")
+    )
+
+    # ECR tokens are valid for 12 hours
+    return username, password, auth_data["expiresAt"].timestamp()
+
+
+def registry_url(node_config):
+    return node_config["docker_repo"].split("/")[0]
+
+
+def ensure_repository(node_config, name):
+    """Creates the ECR repository `name` in the node's registry unless it exists"""
+    aws_public, aws_secret = get_aws_keys()
+    ecr_client = boto3.client(
+        "ecr",
+        region_name="us-east-1",
+        aws_access_key_id=aws_public,
+        aws_secret_access_key=aws_secret,
+    )
+    try:
+        ecr_client.create_repository(repositoryName=name)
+    except ecr_client.exceptions.RepositoryAlreadyExistsException:
+        pass
+
+
+def cleanup(node_config):
+    aws_public, aws_secret = get_aws_keys()
+    ecr_client = boto3.client(
+        "ecr",
+        region_name="us-east-1",
+        aws_access_key_id=aws_public,
+        aws_secret_access_key=aws_secret,
+    )
+
+    docker_repo_name = node_config["docker_repo"].split("/")[-1]
+
+    resp = ecr_client.list_images(
+        repositoryName=docker_repo_name, filter={"tagStatus": "UNTAGGED"}
+    )
+
+    imageIds = resp["imageIds"]
+    if len(imageIds) == 0:
+        return []
+
+    resp = ecr_client.batch_delete_image(
+        repositoryName=docker_repo_name, imageIds=imageIds
+    )
+
+    return resp["imageIds"]
+
+
+def check_validity(key_id, secret):
+    try:
+        client = boto3.client("s3", aws_access_key_id=key_id, aws_secret_access_key=secret)
+        client.list_buckets()
+    except Exception as e:
+        if "NotSignedUp" in str(e):
+            raise exception_with_msg(
+                f"Your AWS keys are valid, but the account is not finished signing up. "
+                f"You either need to update your credit card in AWS at "
+                f"https://portal.aws.amazon.com/billing/signup?type=resubscribe#/resubscribed, "
+                f"or wait up to 24 hours for their verification process to complete."
+            )
+
+        raise exception_with_msg(
+            f"AWS keys seem to be invalid. Make sure you've entered them correctly "
+            f"and that your user has the necessary permissions (for help, see "
+            f"https://github.com/numerai/numerai-cli/wiki/Amazon-Web-Services)."
+        )
+
+
+def monitor(node, config, verbose, num_lines, log_type, follow_tail, trigger_id=None):
+    aws_public, aws_secret = get_aws_keys()
+    logs_client = boto3.client(
+        "logs",
+        region_name="us-east-1",
+        aws_access_key_id=aws_public,
+        aws_secret_access_key=aws_secret,
+    )
+    ecs_client = boto3.client(
+        "ecs",
+        region_name="us-east-1",
+        aws_access_key_id=aws_public,
+        aws_secret_access_key=aws_secret,
+    )
+
+    if verbose and log_type == LOG_TYPE_WEBHOOK:
+        print_aws_webhook_logs(logs_client, config["webhook_log_group"], num_lines)
+
+    probe = TaskProbe(
+        node,
+        config,
+        ecs_client,
+        logs_client,
+        trigger_id,
+        follow_logs=(verbose or follow_tail) and log_type == LOG_TYPE_CLUSTER,
+    )
+    if not watch(probe, log_grace=MONITOR_LOG_GRACE_SECONDS):
+        click.secho(
+            f"\nTimeout after {MONITOR_TIMEOUT_SECONDS // 60} minutes, please run the "
+            f"`numerai node status` command for this model or visit the log console:\n"
+            f"https://console.aws.amazon.com/cloudwatch/home?"
+            f"region=us-east-1#logsV2:log-groups/log-group/$252Ffargate$252Fservice$252F{node}",
+            fg="red",
+        )
+
+
+class TaskProbe(Probe):
+    """Follows the node's latest ECS task, or the one started for `trigger_id`"""
+
+    def __init__(
+        self, node, config, ecs_client, logs_client, trigger_id, follow_logs
+    ):
+        self.node = node
+        self.config = config
+        self.ecs_client = ecs_client
+        self.logs_client = logs_client
+        self.trigger_id = trigger_id
+        self.follow_logs = follow_logs
+        self.start_time = datetime.now(timezone.utc) - timedelta(minutes=1)
+        self.task = None
+        # the webhook group is followed for the whole run, the task stream
+        # only for as long as that task is the one being watched
+        self.webhook_follower = None
+        self.task_follower = None
+        self.followed_task = None
+
+    def status(self):
+        task, done, message, color = get_recent_task_status_aws(
+            self.config["cluster_arn"], self.ecs_client, self.node, self.trigger_id
+        )
+        if task is not None:
+            self.task = task
+        return done, message, color
+
+    def logs(self):
+        if not self.follow_logs:
+            return None
+        task = self.task
+        if task is None:
+            # there are no logs to follow (yet), nor to wait for after a run
+            return None
+        # the webhook invocation that started the task logs shortly before it
+        since = min(self.start_time, task["createdAt"] - timedelta(minutes=1))
+        if self.webhook_follower is None:
+            self.webhook_follower = LogFollower(
+                self.logs_client, [(self.config["webhook_log_group"], None)], since
+            )
+        if self.followed_task != task["taskArn"]:
+            self.task_follower = LogFollower(
+                self.logs_client,
+                [
+                    (
+                        self.config["cluster_log_group"],
+                        [f'ecs/default/{task["taskArn"].split("/")[-1]}'],
+                    )
+                ],
+                since,
+            )
+            self.followed_task = task["taskArn"]
+        events = self.webhook_follower.read() + self.task_follower.read()
+        events.sort(key=lambda event: event["timestamp"])
+        print_log_events(events)
+        return len(events)
+
+
+def get_recent_task_status_aws(cluster_arn, ecs_client, node, trigger_id):
+    tasks = ecs_client.list_tasks(cluster=cluster_arn, family=node)
+
+    pending_codes = ["PROVISIONING", "PENDING", "ACTIVATING"]
+    running_codes = ["RUNNING", "DEACTIVATING", "STOPPING"]
+    stopped_codes = ["DEPROVISIONING", "STOPPED", "DELETED"]
+
+    # try to find stopped tasks
+    if len(tasks["taskArns"]) == 0:
+        tasks = ecs_client.list_tasks(
+            cluster=cluster_arn, desiredStatus="STOPPED", family=node
+        )
+
+    if len(tasks["taskArns"]) == 0:
+        message = (
+            "No recent tasks found!"
+            if trigger_id is None
+            else "No tasks yet, still waiting..."
+        )
+        color = "red" if trigger_id is None else "yellow"
+        return None, trigger_id is None, message, color
+
+    tasks = ecs_client.describe_tasks(cluster=cluster_arn, tasks=tasks["taskArns"])
+
+    matched_task = None
+
+    if trigger_id is not None:
+        for task in tasks["tasks"]:
+            matching_override = list(
+                filter(
+                    lambda e: e["value"] == trigger_id,
+                    task["overrides"]["containerOverrides"][0]["environment"],
+                )
+            )
+            if len(matching_override) == 1:
+                matched_task = task
+                break
+    else:
+        matched_task = tasks["tasks"][-1]
+
+    if matched_task == None:
+        return matched_task, False, "Waiting for job to start...", "yellow"
+    elif (
+        matched_task["lastStatus"] in stopped_codes
+        and "reason" in matched_task["containers"][0]
+    ):
+        return (
+            matched_task,
+            True,
+            f'Job failed! Container exited with code {matched_task["containers"][0]["exitCode"]}\r',
+            "red",
+        )
+    elif matched_task["lastStatus"] in stopped_codes:
+        return matched_task, True, "Job execution finished!\r", "green"
+    elif matched_task["lastStatus"] in pending_codes:
+        return matched_task, False, "Waiting for job to start...", "yellow"
+    elif matched_task["lastStatus"] in running_codes:
+        return matched_task, False, "Waiting for job to complete...", "yellow"
+    return matched_task, False, "Waiting for job to start...", "yellow"
+
+
+def print_aws_webhook_logs(logs_client, log_group, limit, raise_on_error=True):
+    follower = LogFollower(
+        logs_client,
+        [(log_group, None)],
+        datetime.now(timezone.utc) - WEBHOOK_LOG_LOOKBACK,
+    )
+    if follower.poll(limit) > 0:
+        return True
+
+    if not raise_on_error:
+        return False
+    raise exception_with_msg(
+        "No logs found. Make sure the webhook has triggered by checking "
+        "`numerai node status` and make sure a task is in the RUNNING state "
+        "(this can take a few minutes). Also, make sure your webhook has "
+        "triggered at least once by running `numerai node test`"
+    )
+
+
+class LogFollower:
+    """
+    Follows CloudWatch log events across log groups with FilterLogEvents.
+    Each poll reads every group from the cursor's time window, merges the
+    events in timestamp order and prints only the ones not read before.
+    """
+
+    def __init__(self, logs_client, sources, since):
+        self.logs_client = logs_client
+        # (log group, stream names or None for all of the group's streams)
+        self.sources = sources
+        self.cursor = LogCursor(int(since.timestamp() * 1000), LOG_OVERLAP_MS)
+
+    def read(self):
+        """Returns the events logged since the last read, oldest first"""
+        paginator = self.logs_client.get_paginator("filter_log_events")
+        events = []
+        for log_group, stream_names in self.sources:
+            kwargs = {"logGroupName": log_group, "startTime": self.cursor.resume_from}
+            if stream_names:
+                kwargs["logStreamNames"] = stream_names
+            try:
+                for page in paginator.paginate(**kwargs):
+                    events.extend(page["events"])
+            except botocore.exceptions.ClientError as error:
+                # log groups and streams only exist once something logged to them
+                if error.response["Error"]["Code"] != "ResourceNotFoundException":
+                    raise error
+
+        events.sort(key=lambda event: event["timestamp"])
+        return [
+            event
+            for event in events
+            if self.cursor.accept(event["eventId"], event["timestamp"])
+        ]
+
+    def poll(self, limit=None):
+        """Prints the events logged since the last poll, returns how many"""
+        events = self.read()
+        if limit is not None and len(events) > limit:
+            click.echo("...more log lines available: use -n option to get more...")
+            events = events[-limit:]
+        print_log_events(events)
+        return len(events)
+
+
+def print_log_events(events):
+    for event in events:
+        click.echo(
+            f"[{event['logStreamName']}] "
+            f"{str(datetime.fromtimestamp(event['timestamp'] / 1000))}: {event['message']}"
+        )
@@ -0,0 +1,340 @@
+"""Azure implementation of the provider specific CLI operations"""
+
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import click
+from azure.containerregistry import ContainerRegistryClient, ArtifactManifestOrder
+from azure.core.credentials import AzureNamedKeyCredential
+from azure.core.exceptions import ClientAuthenticationError, ResourceNotFoundError
+from azure.data.tables import TableServiceClient, TableClient
+from azure.identity import ClientSecretCredential
+from azure.mgmt.containerregistry import ContainerRegistryManagementClient
+from azure.mgmt.storage import StorageManagementClient
+from azure.mgmt.subscription import SubscriptionClient
+
+from numerai.cli.constants import (
+    BUILD_CACHE_TAG,
+    LOGIN_TTL_SECONDS,
+    MONITOR_TIMEOUT_SECONDS,
+    AZURE_MONITOR_SESSION_KEY,
+    AZURE_MONITOR_SESSION_TTL_SECONDS,
+)
+from numerai.cli.util.debug import exception_with_msg
+from numerai.cli.util.files import update_node
+from numerai.cli.util.keys import get_azure_keys, key_store
+from numerai.cli.util.monitor import Probe, watch
+
+TABLE_ENDPOINT_SUFFIX = "table.core.windows.net"
+
+_credentials = {}
+_credentials_lock = threading.Lock()
+
+
+def get_credential(client_id, tenant_id, client_secret):
+    """
+    Returns the ClientSecretCredential of a service principal, created once
+    per process so that its access tokens are shared by every Azure client.
+    """
+    with _credentials_lock:
+        key = (client_id, tenant_id, client_secret)
+        if key not in _credentials:
+            _credentials[key] = ClientSecretCredential(
+                client_id=client_id, tenant_id=tenant_id, client_secret=client_secret
+            )
+        return _credentials[key]
+
+
+def azure_credential():
+    _, azure_client, azure_tenant, azure_secret = get_azure_keys()
+    return get_credential(azure_client, azure_tenant, azure_secret)
+
+
+def login(node_config):
+    azure_subs_id = get_azure_keys()[0]
+    credentials = azure_credential()
+    username_password = ContainerRegistryManagementClient(
+        credentials, azure_subs_id
+    ).registries.list_credentials(
+        node_config["registry_rg_name"], node_config["registry_name"]
+    )
+    username = username_password.username
+    password = username_password.passwords[0].value
+    # admin credentials don't expire, re-login periodically in case they are rotated
+    return username, password, time.time() + LOGIN_TTL_SECONDS
+
+
+def registry_url(node_config):
+    return node_config["docker_repo"].split("/")[0]
+
+
+def ensure_repository(node_config, name):
+    # ACR creates repositories on first push
+    pass
+
+
+def cleanup(node_config):
+    credentials = azure_credential()
+    acr_client = ContainerRegistryClient(node_config["acr_login_server"], credentials)
+    docker_repo = node_config["docker_repo"]
+    node_repo_name = [
+        repo_name
+        for repo_name in acr_client.list_repository_names()
+        if repo_name == docker_repo.split("/")[-1]
+    ][0]
+
+    # get all manifests, ordered by last update time
+    manifest_list = [
+        repo_detail
+        for repo_detail in acr_client.list_manifest_properties(
+            node_repo_name, order_by=ArtifactManifestOrder.LAST_UPDATED_ON_DESCENDING
+        )
+    ]
+    # Remove all but the latest manifest, keeping the build cache
+    manifest_list = [
+        manifest
+        for manifest in manifest_list
+        if BUILD_CACHE_TAG not in (manifest.tags or [])
+    ]
+    removed_manifests = []
+    for manifest in manifest_list[1:]:
+        acr_client.update_manifest_properties(
+            node_repo_name, manifest.digest, can_write=True, can_delete=True
+        )
+        removed_manifests.append(manifest.digest)
+        acr_client.delete_manifest(node_repo_name, manifest.digest)
+    return removed_manifests
+
+
+def check_validity(subs_id, client_id, tenant_id, secret):
+    try:
+        credentials = get_credential(client_id, tenant_id, secret)
+        sub_client = SubscriptionClient(credentials)
+        subs = [sub.as_dict() for sub in sub_client.subscriptions.list()]
+        all_subs_ids = [subs_details["subscription_id"] for subs_details in subs]
+        if subs_id not in all_subs_ids:
+            raise Exception("Invalid Subscription ID")
+
+    except Exception as e:
+        error_msg = (
+            f"Make sure you follow the instructions in the wiki page: "
+            + f"https://github.com/numerai/numerai-cli/blob/master/docs/azure_setup_guide.md"
+            + f"to set up the Client ID, Tenant ID and Client Secret correctly."
+        )
+        if "AADSTS700016" in str(e):
+            raise exception_with_msg(f"Invalid Client ID. " + error_msg)
+        elif "double check your tenant name" in str(e):
+            raise exception_with_msg(f"Invalid Tenant ID. " + error_msg)
+        elif "Invalid client secret" in str(e):
+            raise exception_with_msg(f"Invalid Client Secret. " + error_msg)
+        elif "Invalid Subscription ID" in str(e):
+            raise exception_with_msg(
+                f"Azure Subscription ID is invalid, or IAM is NOT set up correctly. "
+                + f"Your Azure Client ID, Tenant ID and Client Secret are valid. "
+                + f"Make sure to follow the instructions in the wiki page: "
+                + f"https://github.com/numerai/numerai-cli/blob/master/docs/azure_setup_guide.md"
+            )
+
+
+def monitor(node, config, verbose, num_lines, log_type, follow_tail, trigger_id=None):
+    """
+    Monitor the logs of a node on Azure to see if the submission is completed
+    """
+
+    # Go get the log for all webhook calls started in the last 1 minutes
+    monitor_start_time = datetime.now(timezone.utc) - timedelta(minutes=1)
+
+    # Query the table until the webhook's run is done (log printed) or the monitor times out
+    probe = HistoryProbe(node, config, monitor_start_time, verbose)
+    if not watch(probe):
+        click.secho(
+            f"Monitor timeout after {MONITOR_TIMEOUT_SECONDS // 60} minutes, container run "
+            f"status cannot be determined. Recommended to check ran status directly on Azure Portal",
+            fg="red",
+        )
+        exit(1)
+
+
+class HistoryProbe(Probe):
+    """Follows the webhook's run in its durable functions History table"""
+
+    def __init__(self, node, config, monitor_start_time, verbose):
+        self.node = node
+        self.config = config
+        self.history = RunHistoryReader(
+            history_table_client(node, config), monitor_start_time
+        )
+        self.verbose = verbose
+        self.shown_events = 0
+
+    def status(self):
+        try:
+            monitoring_done, shown_events = self.history.refresh_and_print()
+        except (ClientAuthenticationError, ResourceNotFoundError):
+            # the cached storage key was rotated or the table was recreated
+            self.history.table_client = history_table_client(
+                self.node, self.config, refresh=True
+            )
+            monitoring_done, shown_events = self.history.refresh_and_print()
+        self.shown_events += shown_events
+        if monitoring_done:
+            return True, "Webhook run finished", "green"
+        if self.shown_events == 0 and self.verbose:
+            return False, "No log events yet, still waiting...\r", "yellow"
+        return False, "Waiting for submission run to finish...\r", "yellow"
+
+
+def history_table_client(node, config, refresh=False):
+    """
+    Client for the durable functions History table of the node's webhook.
+    Finding the table takes several management calls, so the session (table
+    endpoint and name) is cached in the node's config and the storage account
+    key in the keys file, until they expire or `refresh` is set.
+    """
+    account_name = config["webhook_storage_account_name"]
+    session = config.get(AZURE_MONITOR_SESSION_KEY)
+    access_key = key_store.azure_storage_key(account_name)
+    if (
+        refresh
+        or not session
+        or session["expires"] < time.time()
+        or access_key is None
+    ):
+        session, access_key = resolve_monitor_session(config)
+        key_store.update("azure_storage", {account_name: access_key})
+        update_node(node, {AZURE_MONITOR_SESSION_KEY: session})
+        config[AZURE_MONITOR_SESSION_KEY] = session
+
+    return TableClient(
+        endpoint=session["endpoint"],
+        table_name=session["table_name"],
+        credential=AzureNamedKeyCredential(account_name, access_key),
+    )
+
+
+def resolve_monitor_session(config):
+    """Looks up the webhook's storage account key and History table"""
+    azure_subs_id = get_azure_keys()[0]
+    resource_group_name = config["resource_group_name"]
+    storage_account_name = config["webhook_storage_account_name"]
+    storage_client = StorageManagementClient(
+        credential=azure_credential(), subscription_id=azure_subs_id
+    )
+    storage_keys = storage_client.storage_accounts.list_keys(
+        resource_group_name=resource_group_name, account_name=storage_account_name
+    )
+    if len([keys for keys in storage_keys.keys]) == 0:
+        click.secho(
+            f"Webhook's storage account key not found, check storage account name: {storage_account_name}",
+            fg="red",
+        )
+        exit(1)
+
+    # Now we have the storage account's access keys
+    access_key = [keys for keys in storage_keys.keys][0].value
+    endpoint = f"https://{storage_account_name}.{TABLE_ENDPOINT_SUFFIX}"
+
+    # Get the table that store the run history for the webhook from the Azure storage account
+    table_service_client = TableServiceClient(
+        endpoint=endpoint,
+        credential=AzureNamedKeyCredential(storage_account_name, access_key),
+    )
+    table_name = [
+        table.name
+        for table in table_service_client.list_tables()
+        if "History" in table.name
+    ][0]
+    session = {
+        "endpoint": endpoint,
+        "table_name": table_name,
+        "expires": time.time() + AZURE_MONITOR_SESSION_TTL_SECONDS,
+    }
+    return session, access_key
+
+
+# the History table columns the monitor prints
+HISTORY_COLUMNS = [
+    "PartitionKey",
+    "RowKey",
+    "Timestamp",
+    "EventType",
+    "_Timestamp",
+    "Name",
+    "Result",
+]
+# rows don't always become visible in Timestamp order, so every query re-reads
+# this far behind the newest row seen and drops the rows already shown
+HISTORY_OVERLAP = timedelta(seconds=30)
+
+
+class RunHistoryReader:
+    """
+    Incrementally reads a durable functions History table. The table keeps
+    every run the webhook ever made, so each read only asks the service for
+    rows modified after a watermark (the newest Timestamp seen) instead of
+    listing the whole table.
+    """
+
+    def __init__(self, table_client, start_time):
+        self.table_client = table_client
+        self.start_time = start_time
+        self.watermark = start_time
+        # (PartitionKey, RowKey) -> Timestamp of rows read within the overlap
+        self.seen = {}
+        # PartitionKey (orchestration instance) -> its ExecutionStarted event
+        self.started = {}
+
+    def read(self):
+        """Returns the events written since the last read, oldest first"""
+        entities = self.table_client.query_entities(
+            "Timestamp gt @after",
+            parameters={"after": self.watermark - HISTORY_OVERLAP},
+            select=HISTORY_COLUMNS,
+        )
+        events = []
+        for entity in entities:
+            key = (entity["PartitionKey"], entity["RowKey"])
+            if key in self.seen:
+                continue
+            modified = entity.metadata.get("timestamp") or self.watermark
+            self.seen[key] = modified
+            self.watermark = max(self.watermark, modified)
+            event_time = entity.get("_Timestamp")
+            if entity.get("EventType") and event_time and event_time > self.start_time:
+                events.append(entity)
+
+        horizon = self.watermark - HISTORY_OVERLAP
+        self.seen = {
+            key: modified for key, modified in self.seen.items() if modified > horizon
+        }
+        return sorted(events, key=lambda event: event["_Timestamp"])
+
+    def refresh_and_print(self):
+        """
+        Prints the runs started and completed since the last refresh.
+        Returns whether a run completed and how many events were new.
+        """
+        monitoring_done = False
+        events = self.read()
+        for event in events:
+            if event["EventType"] == "ExecutionStarted":
+                self.started[event["PartitionKey"]] = event
+                click.secho(
+                    f"Azure Trigger Function: '{event.get('Name')}' started", fg="green"
+                )
+            elif event["EventType"] == "ExecutionCompleted":
+                started = self.started.get(event["PartitionKey"])
+                # the run may have started before the monitor did
+                func_name = started.get("Name") if started else event.get("Name")
+                click.secho(f"Azure Trigger Function: '{func_name}' ended", fg="green")
+                if started is not None:
+                    time_taken = event["_Timestamp"] - started["_Timestamp"]
+                    click.secho(
+                        f"'{func_name}' time taken: "
+                        f"{time_taken.total_seconds() / 60:.2f} mins"
+                    )
+                click.secho(f"'{func_name}' result: {event.get('Result')}")
+                monitoring_done = True
+
+        return monitoring_done, len(events)
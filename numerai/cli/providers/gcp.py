@@ -0,0 +1,453 @@
+"""GCP implementation of the provider specific CLI operations"""
+
+import base64
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+import click
+import google.cloud.artifactregistry_v1 as artifactregistry_v1
+import google.cloud.logging_v2 as logging_v2
+import google.cloud.run_v2 as run_v2
+from google.api_core import exceptions as api_exceptions
+from google.auth import exceptions as auth_exceptions
+from google.cloud import storage
+from google.cloud.logging_v2.services.logging_service_v2 import LoggingServiceV2Client
+from google.oauth2 import service_account
+from google.protobuf import duration_pb2, json_format
+
+from numerai.cli.constants import *
+from numerai.cli.util.debug import exception_with_msg
+from numerai.cli.util.keys import get_gcp_keys
+from numerai.cli.util.monitor import LogCursor, Probe, watch
+
+# executions are listed in small pages since lookups rarely go past the first few
+EXECUTIONS_PAGE_SIZE = 10
+# log reads resume this far behind the newest entry, for entries ingested late
+LOG_OVERLAP = timedelta(seconds=30)
+# log lines held between polls while tailing, the oldest are dropped first
+LOG_BUFFER_LINES = 10000
+# how long the tail API holds entries back to return them in order
+TAIL_BUFFER_WINDOW_SECONDS = 2
+
+
+def login(node_config):
+    gcp_keys_path = get_gcp_keys()
+    gcp_keys_file = open(gcp_keys_path, "r")
+    gcp_keys = gcp_keys_file.read()
+    username = "_json_key_base64"
+    password = base64.b64encode(gcp_keys.encode()).decode("utf-8")
+    # service account keys don't expire, re-login periodically in case they are rotated
+    return username, password, time.time() + LOGIN_TTL_SECONDS
+
+
+def registry_url(node_config):
+    return node_config["artifact_registry_login_url"]
+
+
+def ensure_repository(node_config, name):
+    # images are created inside the node's Artifact Registry repository on first push
+    pass
+
+
+def cleanup(node_config):
+    gcp_key_path = get_gcp_keys()
+    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = gcp_key_path
+
+    node_name = node_config["docker_repo"].split("/")[-1]
+
+    client = artifactregistry_v1.ArtifactRegistryClient()
+    list_images_request = artifactregistry_v1.ListDockerImagesRequest(
+        parent=node_config["registry_id"]
+    )
+    page_result = client.list_docker_images(request=list_images_request)
+
+    # keep the latest image and the build cache
+    kept_image_names = set()
+    for response in page_result:
+        if "latest" in response.tags or BUILD_CACHE_TAG in response.tags:
+            kept_image_names.add(response.name)
+
+    versions = artifactregistry_v1.ListVersionsRequest(
+        parent=f"{node_config['registry_id']}/packages/{node_name}"
+    )
+    page_result = client.list_versions(request=versions)
+    versions_to_delete = []
+    for response in page_result:
+        if response.metadata["name"] not in kept_image_names:
+            versions_to_delete.append(response.name)
+
+    for version in versions_to_delete:
+        client.delete_version(name=version)
+
+    # Nothing to do
+    return versions_to_delete
+
+
+def check_validity():
+    try:
+        credentials = service_account.Credentials.from_service_account_file(
+            GCP_KEYS_PATH
+        )
+        client = storage.Client(credentials=credentials)
+        client.list_buckets()
+    except Exception as e:
+        error_msg = (
+            f"Make sure you follow the instructions in the wiki page: "
+            + f"https://github.com/numerai/numerai-cli/blob/master/docs/gcp_setup_guide.md"
+            + f"to set up the keys file correctly."
+        )
+        if "Request had invalid authentication credentials." in str(e):
+            raise exception_with_msg(f"Invalid credentials. " + error_msg)
+        else:
+            raise e
+
+
+def monitor(node, config, verbose, num_lines, log_type, follow_tail, trigger_id=None):
+    gcp_key_path = get_gcp_keys()
+    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = gcp_key_path
+    client = run_v2.ExecutionsClient()
+
+    # Setup logging if necessary
+    logging_client = None
+    if verbose or follow_tail:
+        logging_client = logging_v2.Client()
+
+    if verbose and log_type == LOG_TYPE_WEBHOOK:
+        print_gcp_webhook_logs(logging_client, config["job_id"])
+
+    # the execution for a trigger can't have been created before the trigger
+    since = None
+    if trigger_id is not None:
+        since = datetime.now(timezone.utc) - timedelta(minutes=1)
+    probe = ExecutionProbe(
+        config["job_id"],
+        ExecutionIndex(client, config["job_id"], since),
+        logging_client if log_type == LOG_TYPE_CLUSTER else None,
+        trigger_id,
+    )
+    if not watch(probe, log_grace=MONITOR_LOG_GRACE_SECONDS):
+        click.secho(
+            f"Monitoring timed out after {MONITOR_TIMEOUT_SECONDS // 60} minutes without "
+            f"determining the status of your container. Check the status of your "
+            f"container in the Google Cloud console.",
+            fg="red",
+        )
+        exit(1)
+
+
+class ExecutionProbe(Probe):
+    """Follows the job's latest Cloud Run execution, or the one for `trigger_id`"""
+
+    def __init__(self, job_id, executions, logging_client, trigger_id):
+        self.job_id = job_id
+        self.executions = executions
+        self.logging_client = logging_client
+        self.trigger_id = trigger_id
+        self.execution = None
+        # set once the execution finished, its last lines may not be streamed yet
+        self.finished = False
+        self.tail = None
+        self.tail_execution = None
+
+    def status(self):
+        execution = self.executions.get(self.trigger_id)
+        if execution is None:
+            if self.trigger_id is None:
+                return True, "No recent job executions found!", "red"
+            return False, "No job executions yet, still waiting...\r", "yellow"
+        self.execution = execution
+        done, message, color = check_gcp_execution_status(execution)
+        self.finished = done
+        return done, message, color
+
+    def logs(self):
+        if self.logging_client is None:
+            return None
+        execution = self.execution
+        if execution is None:
+            # there are no logs to follow (yet), nor to wait for after a run
+            return None
+        if self.tail_execution != execution.name:
+            self.close()
+            self.tail = LogTail(
+                self.logging_client,
+                execution_log_filter(self.job_id, execution),
+                execution.create_time,
+            )
+            self.tail_execution = execution.name
+            self.tail.start()
+        return self.tail.poll(catch_up=self.finished)
+
+    def close(self):
+        if self.tail is not None:
+            self.tail.stop()
+
+
+class ExecutionIndex:
+    """
+    Index of a Cloud Run job's executions by the TRIGGER_ID their workflow
+    passed in. Executions are listed newest first, and listing stops at the
+    first one that is already indexed or is the one looked for, so a lookup
+    only pages through executions created since the previous one. Once the
+    wanted execution is known it is fetched by name, and not at all after
+    it finished.
+    """
+
+    def __init__(self, client, job_id, since=None):
+        self.client = client
+        self.job_id = job_id
+        # executions created before `since` are never listed
+        self.since = since
+        # execution names, newest first, and the trigger id each ran for
+        self.names = []
+        self.triggers = {}
+        self.finished = {}
+
+    def refresh(self, trigger_id):
+        """Indexes the executions created since the last refresh"""
+        listed = {}
+        request = run_v2.ListExecutionsRequest(
+            parent=self.job_id, page_size=EXECUTIONS_PAGE_SIZE
+        )
+        for execution in self.client.list_executions(request=request):
+            if execution.name in self.triggers:
+                break
+            if self.since is not None and execution.create_time < self.since:
+                break
+            listed[execution.name] = execution
+            self.triggers[execution.name] = execution_trigger_id(execution)
+            if trigger_id is None or self.triggers[execution.name] == trigger_id:
+                break
+        self.names = list(listed) + self.names
+        return listed
+
+    def find(self, trigger_id):
+        """Name of the latest execution for `trigger_id`, or the latest if None"""
+        for name in self.names:
+            if trigger_id is None or self.triggers[name] == trigger_id:
+                return name
+        return None
+
+    def get(self, trigger_id):
+        """
+        The current state of the latest execution for `trigger_id` (or of the
+        latest execution if it's None), None if there is no such execution yet
+        """
+        listed = {}
+        name = self.find(trigger_id)
+        if name is None or trigger_id is None:
+            # the wanted execution may not have been created or indexed yet
+            listed = self.refresh(trigger_id)
+            name = self.find(trigger_id)
+        if name is None:
+            return None
+        if name in self.finished:
+            return self.finished[name]
+
+        execution = listed.get(name)
+        if execution is None:
+            execution = self.client.get_execution(
+                request=run_v2.GetExecutionRequest(name=name)
+            )
+        if check_gcp_execution_status(execution)[0]:
+            self.finished[name] = execution
+        return execution
+
+
+def execution_trigger_id(execution):
+    for env_var in execution.template.containers[0].env:
+        if env_var.name == "TRIGGER_ID":
+            return env_var.value
+    return None
+
+
+def check_gcp_execution_status(execution):
+    condition_based_results = {
+        run_v2.types.Condition.State.CONDITION_SUCCEEDED: [
+            True,
+            "Job execution succeeded!\r",
+            "green",
+        ],
+        run_v2.types.Condition.State.CONDITION_RECONCILING: [
+            False,
+            "Waiting for job to complete...\r",
+            "yellow",
+        ],
+        run_v2.types.Condition.State.CONDITION_PENDING: [
+            False,
+            "Waiting for job to complete...\r",
+            "yellow",
+        ],
+        run_v2.types.Condition.State.CONDITION_FAILED: [True, "Job failed!\r", "red"],
+    }
+
+    completed_condition = list(
+        filter(lambda c: c.type_ == "Completed", execution.conditions)
+    )
+    if len(completed_condition) == 1:
+        if completed_condition[0].state in list((condition_based_results.keys())):
+            return condition_based_results[completed_condition[0].state]
+        else:
+            return (
+                True,
+                f"Unknown job status! Exiting test.\nJob status: {completed_condition.state}\r",
+                "red",
+            )
+    else:
+        return (
+            False,
+            "No job status found. Waiting for job status to resolve....\r",
+            "yellow",
+        )
+
+
+class LogTail:
+    """
+    Follows the entries matching a Cloud Logging filter. The tail API streams
+    entries into a bounded buffer which every poll drains, and when the
+    stream can't be opened or breaks, polls list the entries since the
+    cursor instead. The cursor makes sure each entry is printed once.
+    """
+
+    def __init__(self, logging_client, log_filter, since):
+        self.logging_client = logging_client
+        self.log_filter = log_filter
+        self.cursor = LogCursor(since, LOG_OVERLAP)
+        self.buffer = deque()
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.streaming = False
+        # entries written before the stream opened are listed on the first poll
+        self.backfilled = False
+        self.stopped = threading.Event()
+
+    def start(self):
+        self.streaming = True
+        threading.Thread(target=self._stream, daemon=True).start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def _stream(self):
+        def requests():
+            yield logging_v2.types.TailLogEntriesRequest(
+                resource_names=[f"projects/{self.logging_client.project}"],
+                filter=self.log_filter,
+                buffer_window=duration_pb2.Duration(seconds=TAIL_BUFFER_WINDOW_SECONDS),
+            )
+            # the stream stays open for as long as requests are pending
+            self.stopped.wait()
+
+        try:
+            for response in LoggingServiceV2Client().tail_log_entries(requests()):
+                for entry in response.entries:
+                    self._add(entry.insert_id, entry.timestamp, tail_payload(entry))
+                if self.stopped.is_set():
+                    break
+        except (api_exceptions.GoogleAPICallError, auth_exceptions.GoogleAuthError):
+            pass
+        finally:
+            self.streaming = False
+
+    def _list(self):
+        log_filter = (
+            f'{self.log_filter} timestamp >= "{self.cursor.resume_from.isoformat()}"'
+        )
+        for entry in self.logging_client.list_entries(
+            filter_=log_filter, order_by=logging_v2.ASCENDING
+        ):
+            self._add(entry.insert_id, entry.timestamp, entry.payload)
+
+    def _add(self, insert_id, timestamp, payload):
+        with self.lock:
+            if not self.cursor.accept(insert_id, timestamp):
+                return
+            if len(self.buffer) >= LOG_BUFFER_LINES:
+                self.buffer.popleft()
+                self.dropped += 1
+            self.buffer.append((timestamp, payload))
+
+    def poll(self, catch_up=False):
+        """
+        Prints the entries read since the last poll, returns how many. With
+        `catch_up` the entries since the cursor are listed even while
+        streaming, e.g. once the job finished, as the stream holds entries
+        back for its buffer window and stops when monitoring does.
+        """
+        if catch_up or not self.streaming or not self.backfilled:
+            self._list()
+            self.backfilled = True
+        with self.lock:
+            entries = sorted(self.buffer, key=lambda entry: entry[0])
+            dropped = self.dropped
+            self.buffer.clear()
+            self.dropped = 0
+
+        if dropped:
+            click.secho(f"...{dropped} earlier log lines dropped...", fg="yellow")
+        for timestamp, payload in entries:
+            click.secho(f"{timestamp}: {payload}")
+        return len(entries)
+
+
+def tail_payload(entry):
+    """The payload of a LogEntry from the tail API, as list_entries gives it"""
+    if entry.text_payload:
+        return entry.text_payload
+    if entry.json_payload:
+        return json_format.MessageToDict(type(entry).pb(entry).json_payload)
+    return entry.proto_payload
+
+
+def execution_log_filter(job_id, execution):
+    execution_name = execution.name.split("/")[-1]
+    return " ".join(
+        [
+            'resource.type = "cloud_run_job"',
+            f'resource.labels.job_name = "{job_id.split("/")[-1]}"',
+            f'labels."run.googleapis.com/execution_name" = "{execution_name}"',
+            'labels."run.googleapis.com/task_index" = "0"',
+        ]
+    )
+
+
+def print_gcp_webhook_logs(logging_client, job_id):
+    monitor_start_time = datetime.now(timezone.utc) - timedelta(minutes=30)
+    click.secho("Looking for most recent webhook execution...\r", fg="yellow")
+
+    function_filter = " ".join(
+        [
+            'resource.type = "cloud_function"',
+            f'resource.labels.function_name = "{job_id.split("/")[-1]}"',
+            f'timestamp >= "{monitor_start_time.isoformat()}"',
+        ]
+    )
+
+    # only the newest entry is needed to find the latest execution
+    latest = next(
+        iter(
+            logging_client.list_entries(
+                filter_=function_filter,
+                order_by=logging_v2.DESCENDING,
+                max_results=1,
+            )
+        ),
+        None,
+    )
+    if latest is None:
+        click.secho("No webhook logs in the past 30 minutes.\r", fg="yellow")
+        click.secho(
+            "Try executing your webhook again or run numerai node deploy to make sure your webhook URL is up to date\r",
+            fg="yellow",
+        )
+        return
+
+    execution_filter = (
+        f'{function_filter} labels.execution_id = "{latest.labels["execution_id"]}"'
+    )
+    for log in logging_client.list_entries(
+        filter_=execution_filter, order_by=logging_v2.ASCENDING
+    ):
+        click.secho(f"{log.timestamp}: {log.payload}")
@@ -4,7 +4,7 @@ import click
 import logging
 
 from numerai.cli.constants import *
-from numerai.cli.util.docker import terraform
+from numerai.cli.util.terraform import init_terraform
 from numerai.cli.util.files import maybe_create, copy_files
 from numerai.cli.util.keys import config_numerai_keys, config_provider_keys
 
@@ -63,7 +63,7 @@ def setup(provider, skip_key_setup, verbose):
 
     # terraform init, added provider to init at the specified provider's tf directory
     click.secho("initializing terraform to provision cloud infrastructure...")
-    terraform("init -upgrade ", verbose, provider)
+    init_terraform(provider, verbose)
 
     click.secho("Numerai API Keys setup and working", fg="green")
     click.secho(f"{provider} API Keys setup and working", fg="green")
@@ -2,7 +2,6 @@ import subprocess
 import shutil
 
 import click
-from numerapi import base_api
 
 from numerai.cli.constants import *
 from numerai.cli.util.keys import (
@@ -11,6 +10,7 @@ from numerai.cli.util.keys import (
     get_numerai_keys,
 )
 from numerai.cli.util.docker import terraform
+from numerai.cli.util.files import sync_provider_nodes
 from numerai.cli.util.debug import root_cause
 
 
@@ -37,6 +37,8 @@ def uninstall():
             os.rmdir(CONFIG_PATH)
 
         else:
+            from numerapi import base_api
+
             napi = base_api.Api(*get_numerai_keys())
 
             node_config = load_or_init_nodes()
@@ -45,6 +47,7 @@ def uninstall():
                 napi.set_submission_webhook(config["model_id"], None)
 
             click.secho("destroying cloud resources...")
+            sync_provider_nodes()
             all_keys = load_or_init_keys()
             provider_keys = {}
             for provider in PROVIDERS:
@@ -55,7 +58,7 @@ def uninstall():
                         provider=provider,
                         verbose=True,
                         env_vars=provider_keys,
-                        inputs={"node_config_file": "../nodes.json"},
+                        inputs={"node_config_file": PROVIDER_NODES_FILE},
                     )
 
             click.secho("cleaning up docker images...")
@@ -5,10 +5,14 @@ import click
 
 from numerai.cli.constants import *
 from numerai.cli.util.docker import terraform
-from numerai.cli.util.files import copy_files, store_config, copy_file, move_files
+from numerai.cli.util.terraform import init_terraform
+from numerai.cli.util.files import (
+    copy_files,
+    move_files,
+    sync_provider_nodes,
+)
 from numerai.cli.util.keys import (
     load_or_init_keys,
-    load_or_init_nodes,
     config_numerai_keys,
     config_provider_keys,
 )
@@ -196,21 +200,19 @@ def upgrade(verbose):
 
     # terraform init
     click.secho("Re-initializing terraform...", fg="yellow")
-    terraform("init -upgrade", verbose=verbose, provider="aws")
+    init_terraform("aws", verbose)
 
     if needs_03_upgrade and click.confirm(
         "It's recommended you destroy your current Compute Node. Continue?"
     ):
         click.secho("Removing old cloud infrastructure...", fg="yellow")
-        nodes_config = load_or_init_nodes()
-        store_config(NODES_PATH, nodes_config)
-        copy_file(NODES_PATH, f"{CONFIG_PATH}/aws/", force=True, verbose=True)
+        sync_provider_nodes()
         terraform(
             "destroy -auto-approve",
             verbose,
             provider="aws",
             env_vars=load_or_init_keys("aws"),
-            inputs={"node_config_file": "../nodes.json"},
+            inputs={"node_config_file": PROVIDER_NODES_FILE},
         )
 
     click.secho("Upgrade complete!", fg="green")
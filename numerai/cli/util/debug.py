@@ -2,6 +2,7 @@ import os
 import platform
 import sys
 import json
+import re
 
 import click
 
@@ -35,151 +36,236 @@ def is_win10_professional():
     return False
 
 
-# error checking for docker; sadly this is a mess,
-# especially b/c there's tons of ways to mess up your docker install
-# especially on windows :(
-def root_cause(std_out, err_msg):
-    all_logs = f'{std_out.decode("utf-8") }\n{err_msg.decode("utf-8") }'
-    if b"is not recognized as an internal or external command" in err_msg:
-        if sys.platform == "win32":
-            if is_win10_professional():
+# known failure signatures, matched line by line as output streams:
+# (name, stream to search or None for both, substring, fatal)
+# fatal signatures mean the command cannot succeed, so it is stopped right away
+# instead of waiting for it to exit; only mark signatures fatal for commands that
+# are safe to interrupt (i.e. not terraform output)
+ROOT_CAUSE_SIGNATURES = [
+    ("not_recognized", "stderr", "is not recognized as an internal or external command", False),
+    ("command_not_found", "stderr", "command not found", False),
+    ("daemon_not_running", "stderr", "This error may also indicate that the docker daemon is not running", True),
+    ("daemon_not_running", "stderr", "Is the docker daemon running", True),
+    ("invalid_mode", "stderr", "invalid mode: /opt/plan", False),
+    ("drive_not_shared", "stderr", "Drive has not been shared", True),
+    ("no_configuration_files", "stderr", "No configuration files", False),
+    ("out_of_memory", "stderr", "returned non-zero exit status 137", True),
+    ("name_resolution", "stderr", "Temporary failure in name resolution", False),
+    ("no_fargate_configuration", "stdout", "No Fargate configuration exists for given values.", False),
+    ("cant_add_file", None, "Can't add file", False),
+    ("cant_add_file", "stderr", "Error processing tar file(exit status 1): unexpected EOF", True),
+    ("rootful_daemon", "stderr", "PermissionError: [Errno 13] Permission denied: 'modules.json'", True),
+    ("aws_resource_exists", None, "RepositoryAlreadyExistsException", False),
+    ("aws_resource_exists", None, "EntityAlreadyExists", False),
+    ("aws_resource_exists", None, "ResourceAlreadyExistsException", False),
+    ("submission_deadline", "stderr", "Can't update submission after deadline", False),
+    ("resource_not_found", "stdout", "ResourceNotFoundException", False),
+    ("resource_not_found", "stdout", "NoSuchEntity", False),
+    ("dependency_cycle", "stdout", "Cycle", False),
+]
+
+
+def compile_signatures(signatures):
+    """
+    Compiles the signature table into one alternation regex per stream so each
+    line is scanned once, no matter how many signatures there are. The regex has
+    no capture groups (they disable re's literal search optimizations), matches
+    are mapped back to their signature by the matched text instead.
+    Returns {stream_name: (pattern, {substring: (signature name, fatal)})}.
+    """
+    matchers = {}
+    for stream_name in ("stdout", "stderr"):
+        lookup = {
+            substring: (name, fatal)
+            for name, stream, substring, fatal in signatures
+            if stream is None or stream == stream_name
+        }
+        # longest first, so the longer of two signatures starting at the same
+        # position is the one reported
+        alternatives = sorted(lookup, key=len, reverse=True)
+        pattern = re.compile("|".join(re.escape(a) for a in alternatives))
+        matchers[stream_name] = (pattern, lookup)
+    return matchers
+
+
+ROOT_CAUSE_MATCHERS = compile_signatures(ROOT_CAUSE_SIGNATURES)
+
+
+class RootCauseScanner:
+    """
+    Collects known error signatures from subprocess output one line at a time,
+    so the full log never has to be kept around to explain a failure.
+    """
+
+    def __init__(self):
+        self.found = set()
+        self.err_files = []
+        self.fatal = False
+
+    def feed(self, stream_name, line):
+        """Scans one line of output, returns True once a fatal signature was seen"""
+        if isinstance(line, bytes):
+            line = line.decode("utf-8", errors="replace")
+        pattern, lookup = ROOT_CAUSE_MATCHERS[stream_name]
+        for match in pattern.finditer(line):
+            name, fatal = lookup[match.group()]
+            self.found.add(name)
+            self.fatal = self.fatal or fatal
+        if "Can't add file" in line:
+            self.err_files.append(line.rstrip("\n"))
+        return self.fatal
+
+    def raise_root_cause(self, logs):
+        """
+        Raises a ClickException describing the failure, `logs` is appended to the
+        message when no known signature was found. Returns for non-errors.
+        """
+        found = self.found
+        if "not_recognized" in found:
+            if sys.platform == "win32":
+                if is_win10_professional():
+                    raise exception_with_msg(
+                        f"Docker does not appear to be installed. Make sure to download/install docker from "
+                        f"https://hub.docker.com/editions/community/docker-ce-desktop-windows \n"
+                        f"If you're sure docker is already installed,  then for some reason it isn't in your PATH like expected. "
+                        f"Restarting may fix it."
+                    )
+
+                else:
+                    raise exception_with_msg(
+                        f"Docker does not appear to be installed. Make sure to download/install docker from "
+                        f"https://github.com/docker/toolbox/releases and run 'Docker Quickstart Terminal' when you're done."
+                        f"\nIf you're sure docker is already installed, then for some reason it isn't in your PATH like expected. "
+                        f"Restarting may fix it."
+                    )
+
+        if "command_not_found" in found:
+            if sys.platform == "darwin":
                 raise exception_with_msg(
-                    f"Docker does not appear to be installed. Make sure to download/install docker from "
-                    f"https://hub.docker.com/editions/community/docker-ce-desktop-windows \n"
-                    f"If you're sure docker is already installed,  then for some reason it isn't in your PATH like expected. "
-                    f"Restarting may fix it."
+                    f"Docker does not appear to be installed. You can install it with `brew cask install docker` or "
+                    f"from https://hub.docker.com/editions/community/docker-ce-desktop-mac"
                 )
 
             else:
                 raise exception_with_msg(
-                    f"Docker does not appear to be installed. Make sure to download/install docker from "
-                    f"https://github.com/docker/toolbox/releases and run 'Docker Quickstart Terminal' when you're done."
-                    f"\nIf you're sure docker is already installed, then for some reason it isn't in your PATH like expected. "
-                    f"Restarting may fix it."
+                    f"docker command not found. Please install docker "
+                    f"and make sure that the `docker` command is in your $PATH"
                 )
 
-    if b"command not found" in err_msg:
-        if sys.platform == "darwin":
-            raise exception_with_msg(
-                f"Docker does not appear to be installed. You can install it with `brew cask install docker` or "
-                f"from https://hub.docker.com/editions/community/docker-ce-desktop-mac"
-            )
+        if "daemon_not_running" in found:
+            if sys.platform == "darwin":
+                raise exception_with_msg(
+                    f"Docker daemon not running. Make sure you've started "
+                    f"'Docker Desktop' and then run this command again."
+                )
+
+            elif sys.platform.startswith("linux"):
+                raise exception_with_msg(
+                    f"Docker daemon not running or this user cannot acccess the docker socket. "
+                    f"Make sure docker is running and that your user has permissions to run docker. "
+                    f"On most systems, you can add your user to the docker group like so: "
+                    f"`sudo groupadd docker; sudo usermod -aG docker $USER` and then restarting your computer."
+                )
+
+            elif sys.platform == "win32":
+                if "DOCKER_TOOLBOX_INSTALL_PATH" in os.environ:
+                    raise exception_with_msg(
+                        f"Docker daemon not running. Make sure you've started "
+                        f"'Docker Quickstart Terminal' and then run this command again."
+                    )
+
+                else:
+                    raise exception_with_msg(
+                        f"Docker daemon not running. Make sure you've started "
+                        f"'Docker Desktop' and then run this command again."
+                    )
+
+        if "invalid_mode" in found:
+            if sys.platform == "win32":
+                raise exception_with_msg(
+                    f"You're running Docker Toolbox, but you're not using the 'Docker Quickstart Terminal'. "
+                    f"Please re-run `numerai setup` from that terminal."
+                )
 
-        else:
+        if "drive_not_shared" in found:
             raise exception_with_msg(
-                f"docker command not found. Please install docker "
-                f"and make sure that the `docker` command is in your $PATH"
+                f"You're running from a directory that isn't shared to your docker Daemon. "
+                f"Make sure your directory is shared through Docker Desktop: "
+                f"https://docs.docker.com/docker-for-windows/#shared-drives"
             )
 
-    if (
-        b"This error may also indicate that the docker daemon is not running" in err_msg
-        or b"Is the docker daemon running" in err_msg
-    ):
-        if sys.platform == "darwin":
+        if "no_configuration_files" in found:
             raise exception_with_msg(
-                f"Docker daemon not running. Make sure you've started "
-                f"'Docker Desktop' and then run this command again."
+                "You're running from a directory that isn't shared to your docker Daemon. \
+                Try running from a directory under your HOME, e.g. C:\\Users\\$YOUR_NAME\\$ANY_FOLDER"
             )
 
-        elif sys.platform == "linux2":
+        if "out_of_memory" in found:
             raise exception_with_msg(
-                f"Docker daemon not running or this user cannot acccess the docker socket. "
-                f"Make sure docker is running and that your user has permissions to run docker. "
-                f"On most systems, you can add your user to the docker group like so: "
-                f"`sudo groupadd docker; sudo usermod -aG docker $USER` and then restarting your computer."
+                "Your docker container ran out of memory. Please open the docker desktop UI"
+                " and increase the memory allowance in the advanced settings."
             )
 
-        elif sys.platform == "win32":
-            if "DOCKER_TOOLBOX_INSTALL_PATH" in os.environ:
-                raise exception_with_msg(
-                    f"Docker daemon not running. Make sure you've started "
-                    f"'Docker Quickstart Terminal' and then run this command again."
-                )
+        if "name_resolution" in found:
+            raise exception_with_msg("You network failed temporarily, please try again.")
 
-            else:
-                raise exception_with_msg(
-                    f"Docker daemon not running. Make sure you've started "
-                    f"'Docker Desktop' and then run this command again."
-                )
+        if "no_fargate_configuration" in found:
+            raise exception_with_msg("Invalid size preset, report this to Numerai")
 
-    if b"invalid mode: /opt/plan" in err_msg:
-        if sys.platform == "win32":
+        if "cant_add_file" in found:
             raise exception_with_msg(
-                f"You're running Docker Toolbox, but you're not using the 'Docker Quickstart Terminal'. "
-                f"Please re-run `numerai setup` from that terminal."
+                "Docker was unable to access some files while trying to build,"
+                "either another program is using them or docker does not have permissions"
+                f"to access them: {json.dumps(self.err_files, indent=2)}"
             )
 
-    if b"Drive has not been shared" in err_msg:
-        raise exception_with_msg(
-            f"You're running from a directory that isn't shared to your docker Daemon. "
-            f"Make sure your directory is shared through Docker Desktop: "
-            f"https://docs.docker.com/docker-for-windows/#shared-drives"
-        )
-
-    if b"No configuration files" in err_msg:
-        raise exception_with_msg(
-            "You're running from a directory that isn't shared to your docker Daemon. \
-            Try running from a directory under your HOME, e.g. C:\\Users\\$YOUR_NAME\\$ANY_FOLDER"
-        )
-
-    if b"returned non-zero exit status 137" in err_msg:
-        raise exception_with_msg(
-            "Your docker container ran out of memory. Please open the docker desktop UI"
-            " and increase the memory allowance in the advanced settings."
-        )
-
-    if b"Temporary failure in name resolution" in err_msg:
-        raise exception_with_msg("You network failed temporarily, please try again.")
+        if "rootful_daemon" in found:
+            raise exception_with_msg(
+                "It looks like Docker daemon is running as root, please restart in rootless"
+                "mode: https://docs.docker.com/engine/security/rootless/"
+            )
 
-    if b"No Fargate configuration exists for given values." in std_out:
-        raise exception_with_msg("Invalid size preset, report this to Numerai")
+        if "aws_resource_exists" in found:
+            raise exception_with_msg(
+                "AWS resources with the names this node expects already exist in your account, "
+                "but they are not tracked in the current local Terraform state. "
+                "This usually happens after a partial previous apply. "
+                "Delete or import the existing AWS resources shown above, then retry."
+            )
 
-    if (
-        "Can't add file" in all_logs
-        or b"Error processing tar file(exit status 1): unexpected EOF" in err_msg
-    ):
-        err_files = [f for f in all_logs.split("\n") if "Can't add file" in f]
-        raise exception_with_msg(
-            "Docker was unable to access some files while trying to build,"
-            "either another program is using them or docker does not have permissions"
-            f"to access them: {json.dumps(err_files, indent=2)}"
-        )
+        # these are non-errors that either shouldn't be handled or are handled elsewhere
+        if "submission_deadline" in found:
+            return
+        if "resource_not_found" in found:
+            return
 
-    if b"PermissionError: [Errno 13] Permission denied: 'modules.json'" in err_msg:
-        raise exception_with_msg(
-            "It looks like Docker daemon is running as root, please restart in rootless"
-            "mode: https://docs.docker.com/engine/security/rootless/"
-        )
+        if "dependency_cycle" in found:
+            raise exception_with_msg(
+                "You upgraded to 1.0+ and need to replace your AWS nodes before continuing!"
+                "\nTo do this now follow these instructions:"
+                '\n run "numerai destroy-all --preserve-node-config"'
+                '\n run "numerai node -m <model_name> config" for each node'
+                '\n run "numerai node -m <model_name> deploy" for each node'
+                "\nIf you do not want to do this, downgrade to 0.4.1 to continue."
+            )
 
-    if (
-        "RepositoryAlreadyExistsException" in all_logs
-        or "EntityAlreadyExists" in all_logs
-        or "ResourceAlreadyExistsException" in all_logs
-    ):
         raise exception_with_msg(
-            "AWS resources with the names this node expects already exist in your account, "
-            "but they are not tracked in the current local Terraform state. "
-            "This usually happens after a partial previous apply. "
-            "Delete or import the existing AWS resources shown above, then retry."
+            f"Numerai CLI was unable to identify an error, please try to use the "
+            f'"--verbose|-v" option for more information before reporting this\n{logs}'
         )
 
-    # these are non-errors that either shouldn't be handled or are handled elsewhere
-    if b"Can't update submission after deadline" in err_msg:
-        return
-    if b"ResourceNotFoundException" in std_out or b"NoSuchEntity" in std_out:
-        return
 
-    if b"Cycle" in std_out:
-        raise exception_with_msg(
-            "You upgraded to 1.0+ and need to replace your AWS nodes before continuing!"
-            "\nTo do this now follow these instructions:"
-            '\n run "numerai destroy-all --preserve-node-config"'
-            '\n run "numerai node -m <model_name> config" for each node'
-            '\n run "numerai node -m <model_name> deploy" for each node'
-            "\nIf you do not want to do this, downgrade to 0.4.1 to continue."
-        )
-
-    raise exception_with_msg(
-        f"Numerai CLI was unable to identify an error, please try to use the "
-        f'"--verbose|-v" option for more information before reporting this\n{all_logs}'
-    )
+# error checking for docker; sadly this is a mess,
+# especially b/c there's tons of ways to mess up your docker install
+# especially on windows :(
+def root_cause(std_out, err_msg):
+    if isinstance(std_out, str):
+        std_out = std_out.encode()
+    if isinstance(err_msg, str):
+        err_msg = err_msg.encode()
+    scanner = RootCauseScanner()
+    for stream_name, output in (("stdout", std_out), ("stderr", err_msg)):
+        for line in output.splitlines(keepends=True):
+            scanner.feed(stream_name, line)
+    all_logs = f'{std_out.decode("utf-8") }\n{err_msg.decode("utf-8") }'
+    scanner.raise_root_cause(all_logs)
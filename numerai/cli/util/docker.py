@@ -1,26 +1,38 @@
-import sys
-import base64
+import atexit
+import glob
+import hashlib
+import json
+import shutil
 import subprocess
-from queue import Queue, Empty
-from threading import Thread
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
 
-import boto3
 import click
 
 from numerai.cli.constants import *
-from numerai.cli.util.debug import root_cause
+from numerai.cli.providers import get_provider
+from numerai.cli.util.debug import RootCauseScanner, exception_with_msg, root_cause
+from numerai.cli.util.files import (
+    file_lock,
+    load_config,
+    maybe_create,
+    store_config,
+    read_dockerignore,
+    dockerfile_sources,
+    hash_build_context,
+    merge_requirements,
+    uses_base_image,
+)
+from numerai.cli.util.process import run_streaming
 from numerai.cli.util.keys import (
+    line_redactor,
     sanitize_message,
-    get_aws_keys,
     load_or_init_keys,
-    get_azure_keys,
-    get_gcp_keys,
     get_gcp_project,
 )
-from azure.mgmt.containerregistry import ContainerRegistryManagementClient
-from azure.containerregistry import ContainerRegistryClient, ArtifactManifestOrder
-from azure.identity import ClientSecretCredential
-import google.cloud.artifactregistry_v1 as artifactregistry_v1
 
 
 def check_for_dockerfile(path):
@@ -43,57 +55,107 @@ def check_for_dockerfile(path):
         exit(1)
 
 
-def subprocess_log(stream, queue):
-    for line in iter(stream.readline, b""):
-        queue.put(line)
-    stream.close()
+_output = threading.local()
+_builder_lock = threading.Lock()
+
+# one long-lived terraform container per (provider, version), see start_tf_runner
+_tf_runners = {}
+_tf_runners_lock = threading.Lock()
+# runner name -> number of terraform commands running in it
+_tf_busy = {}
+_tf_stats = {
+    "startups": 0,
+    "startup_seconds": 0.0,
+    "commands": 0,
+    "command_seconds": 0.0,
+    "verbose": False,
+}
+
+# the base image is built and pushed at most once per process, even by deploy-all
+_base_image_lock = threading.Lock()
+_built_base_images = set()
+_pushed_base_images = set()
+
+
+@contextmanager
+def log_prefix(prefix):
+    """Prefixes every line this thread echoes from executed commands, e.g. with a node name"""
+    previous = get_log_prefix()
+    _output.prefix = prefix
+    try:
+        yield
+    finally:
+        _output.prefix = previous
 
 
-def get_from_q(q, verbose, default=b"", prefix=""):
-    try:
-        res = q.get(block=False)
-        if verbose and res:
-            click.secho(f"{prefix} {res.decode()}")
-        return res
-    except Empty as e:
-        return default
+def get_log_prefix():
+    return getattr(_output, "prefix", "")
+
+
+def print_line(stream_name, line):
+    click.secho(f"{get_log_prefix()}{line.decode(errors='replace').rstrip()}")
 
 
 def execute(command, verbose, censor_substr=None):
+    """
+    Runs a shell command, raising a ClickException explaining the failure if it
+    exits non-zero. Output is classified line by line as it streams and the
+    command is stopped early on a fatal error signature. Only the last
+    OUTPUT_TAIL_BYTES of each stream are kept in memory and returned.
+    """
     if verbose:
-        click.echo("Running: " + sanitize_message(command, censor_substr))
+        click.echo(
+            f"{get_log_prefix()}Running: " + sanitize_message(command, censor_substr)
+        )
 
-    on_posix = "posix" in sys.builtin_module_names
-    proc = subprocess.Popen(
-        command,
-        shell=True,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        close_fds=on_posix,
-    )
-    stdout_q = Queue()
-    stderr_q = Queue()
-    stdout_t = Thread(target=subprocess_log, args=(proc.stdout, stdout_q))
-    stderr_t = Thread(target=subprocess_log, args=(proc.stderr, stderr_q))
+    scanner = RootCauseScanner()
+    # build args carry the numerai secret key, never echo it from the output
+    redact = line_redactor(censor_substr)
+
+    def handle_line(stream_name, line):
+        if verbose:
+            print_line(stream_name, redact(line))
+        # stop the command as soon as it hits an error it can't recover from
+        return scanner.feed(stream_name, line)
 
+    # output spilled to LOGS_PATH is kept for the user to read or share
+    returncode, stdout, stderr = run_streaming(
+        command, on_line=handle_line, redact=redact
+    )
+    failed = returncode != 0 or scanner.fatal
+    # spilled output is only kept when the error raised points the user at it
+    keep_spill = False
     try:
-        stdout_t.start()
-        stderr_t.start()
-        stdout = b""
-        stderr = b""
-        while proc.poll() is None:
-            stdout += get_from_q(stdout_q, verbose)
-            stderr += get_from_q(stderr_q, verbose)
-
-        returncode = proc.poll()
-        if returncode != 0:
-            root_cause(stdout, stderr)
+        if failed:
+            scanner.raise_root_cause(
+                sanitize_message(format_logs(stdout, stderr), censor_substr)
+            )
+    except click.ClickException as e:
+        keep_spill = True
+        saved = [
+            capture.spill_path
+            for capture in (stdout, stderr)
+            if capture.spilled and capture.spill_path not in e.message
+        ]
+        if saved:
+            e.message += f"\nFull command output saved to {', '.join(saved)}"
+        raise
     finally:
-        stdout_t.join()
-        stderr_t.join()
-        proc.kill()
+        stdout.close(keep_spill=keep_spill)
+        stderr.close(keep_spill=keep_spill)
+
+    return stdout.getvalue(), stderr.getvalue()
 
-    return stdout, stderr
+
+def format_logs(*captures):
+    logs = []
+    for capture in captures:
+        if capture.spilled:
+            logs.append(
+                f"...earlier {capture.name} output saved to {capture.spill_path}..."
+            )
+        logs.append(capture.getvalue().decode("utf-8", errors="replace"))
+    return "\n".join(logs)
 
 
 def format_if_docker_toolbox(path, verbose):
@@ -110,19 +172,140 @@ def format_if_docker_toolbox(path, verbose):
     return path
 
 
+def start_tf_runner(provider, version, verbose):
+    """
+    Starts a terraform container for one provider directory that lives as long
+    as this process: its main process waits on a stdin pipe held by us, so the
+    container stops (and is removed) as soon as the CLI exits, even on a crash.
+    Commands are then sent to it with `docker exec`, which skips the container
+    startup a fresh `docker run` pays for every command.
+    """
+    name = f"numerai-terraform-{provider}-{os.getpid()}-{len(_tf_runners)}"
+    cmd = f"docker run --rm -i --name {name}"
+    cmd += f" -v {format_if_docker_toolbox(CONFIG_PATH, verbose)}:/opt/plan"
+    # providers downloaded by any init are shared by every provider directory
+    os.makedirs(TF_PLUGIN_CACHE_PATH, exist_ok=True)
+    cmd += f" -v {format_if_docker_toolbox(TF_PLUGIN_CACHE_PATH, verbose)}:/opt/plugins"
+    cmd += " -e TF_PLUGIN_CACHE_DIR=/opt/plugins"
+    if provider == PROVIDER_GCP:
+        cmd += (
+            f" --mount type=bind,source={GCP_KEYS_PATH},target=/tmp/gcp_keys/keys.json"
+        )
+    cmd += f" -w /opt/plan --entrypoint sh hashicorp/terraform:{version}"
+    cmd += ' -c "echo ready && exec cat"'
+    if verbose:
+        click.echo(f"{get_log_prefix()}Running: {cmd}")
+
+    start = time.time()
+    on_posix = "posix" in sys.builtin_module_names
+    proc = subprocess.Popen(
+        cmd,
+        shell=True,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        close_fds=on_posix,
+    )
+    first_line = proc.stdout.readline()
+    if first_line.strip() != b"ready":
+        stdout, stderr = proc.communicate()
+        # e.g. docker isn't installed or its daemon isn't running
+        root_cause(first_line + stdout, stderr)
+        raise exception_with_msg(
+            f"Failed to start terraform container:\n{stderr.decode(errors='replace')}"
+        )
+    elapsed = time.time() - start
+    _tf_stats["startups"] += 1
+    _tf_stats["startup_seconds"] += elapsed
+    if verbose:
+        click.echo(
+            f"{get_log_prefix()}terraform runner {name} started in {elapsed:.1f}s, "
+            f"later {provider} commands reuse it"
+        )
+    return name, proc
+
+
+def get_tf_runner(provider, version, verbose):
+    with _tf_runners_lock:
+        if (provider, version) not in _tf_runners:
+            if not _tf_runners:
+                atexit.register(stop_tf_runners)
+            _tf_runners[(provider, version)] = start_tf_runner(
+                provider, version, verbose
+            )
+        return _tf_runners[(provider, version)][0]
+
+
+def interrupt_tf_runners(runners=None):
+    """
+    Sends SIGINT to the terraform commands running in `runners` (default: every
+    busy runner) and waits for them to stop. docker exec doesn't forward
+    signals, and a terraform killed mid-apply can leave its state half
+    written, while on SIGINT it stops once the operations in flight finish.
+    """
+    if runners is None:
+        with _tf_runners_lock:
+            runners = [runner for runner, count in _tf_busy.items() if count]
+    if not runners:
+        return
+    click.secho(
+        "waiting for terraform to stop gracefully, interrupt again to stop waiting...",
+        fg="yellow",
+    )
+    for runner in runners:
+        subprocess.run(
+            f"docker exec {runner} pkill -INT terraform",
+            shell=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+    try:
+        for runner in runners:
+            subprocess.run(
+                f'docker exec {runner} sh -c "while pgrep terraform; do sleep 1; done"',
+                shell=True,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+    except KeyboardInterrupt:
+        pass
+
+
+def stop_tf_runners():
+    """Closes the stdin of every runner, which stops and removes its container"""
+    # only reached with commands still running if they were interrupted
+    interrupt_tf_runners()
+    with _tf_runners_lock:
+        runners = list(_tf_runners.values())
+        _tf_runners.clear()
+    for _, proc in runners:
+        proc.stdin.close()
+    for _, proc in runners:
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    if _tf_stats["verbose"] and _tf_stats["commands"]:
+        average_startup = _tf_stats["startup_seconds"] / _tf_stats["startups"]
+        saved = average_startup * (_tf_stats["commands"] - _tf_stats["startups"])
+        click.echo(
+            f"{_tf_stats['commands']} terraform commands ran in "
+            f"{_tf_stats['startups']} runner container(s) "
+            f"({_tf_stats['command_seconds']:.1f}s total), "
+            f"saving ~{saved:.1f}s of container startups"
+        )
+
+
 # Added variable to take in different providers
 def build_tf_cmd(tf_cmd, provider, env_vars, inputs, version, verbose):
-    cmd = f"docker run"
+    # -i attaches stdin like `docker run -i` did, for terraform's prompts
+    cmd = f"docker exec -i"
     if env_vars:
         cmd += " ".join([f' -e "{key}={val}"' for key, val in env_vars.items()])
-    cmd += f" --rm -it -v {format_if_docker_toolbox(CONFIG_PATH, verbose)}:/opt/plan"
     if provider == PROVIDER_GCP:
-        cmd += (
-            f" --mount type=bind,source={GCP_KEYS_PATH},target=/tmp/gcp_keys/keys.json"
-        )
         cmd += f" -e GOOGLE_APPLICATION_CREDENTIALS=/tmp/gcp_keys/keys.json"
         cmd += f" -e GOOGLE_PROJECT={get_gcp_project()}"
-    cmd += f" -w /opt/plan hashicorp/terraform:{version}"
+    cmd += f" {get_tf_runner(provider, version, verbose)} terraform"
     # Added provider to pick the correct provider directory before tf command
     cmd += " ".join([f" -chdir={provider}"])
     cmd += f" {tf_cmd}"
@@ -131,21 +314,61 @@ def build_tf_cmd(tf_cmd, provider, env_vars, inputs, version, verbose):
     return cmd
 
 
+def resources_missing(stdout):
+    """True if terraform output shows resources were deleted outside of terraform"""
+    return b"ResourceNotFoundException" in stdout or b"NoSuchEntity" in stdout
+
+
 # Added variable to take in different providers
-def terraform(tf_cmd, verbose, provider, env_vars=None, inputs=None, version="1.5.6"):
+def terraform(
+    tf_cmd,
+    verbose,
+    provider,
+    env_vars=None,
+    inputs=None,
+    version=TERRAFORM_VERSION,
+    refresh_on_missing=True,
+):
+    """
+    Runs a terraform command in the provider's runner. If the user deleted a
+    resource by hand, terraform is refreshed and the command run again,
+    unless `refresh_on_missing` is False (e.g. for applying a saved plan,
+    which is stale after a refresh and has to be planned again instead).
+    """
     cmd = build_tf_cmd(tf_cmd, provider, env_vars, inputs, version, verbose)
-    stdout, stderr = execute(cmd, verbose)
+    runner = get_tf_runner(provider, version, verbose)
+    stdout, stderr = execute_tf(cmd, tf_cmd, runner, verbose)
     # if user accidentally deleted a resource, refresh terraform and try again
-    if b"ResourceNotFoundException" in stdout or b"NoSuchEntity" in stdout:
-        refresh = build_tf_cmd("refresh", env_vars, inputs, version, verbose)
-        execute(refresh, verbose)
-        stdout, stderr = execute(cmd, verbose)
+    if refresh_on_missing and resources_missing(stdout):
+        refresh = build_tf_cmd("refresh", provider, env_vars, inputs, version, verbose)
+        execute_tf(refresh, "refresh", runner, verbose)
+        stdout, stderr = execute_tf(cmd, tf_cmd, runner, verbose)
     return stdout
 
 
-def build(node_config, node, verbose):
-    numerai_keys = load_or_init_keys()["numerai"]
+def execute_tf(cmd, tf_cmd, runner, verbose):
+    start = time.time()
+    with _tf_runners_lock:
+        _tf_busy[runner] = _tf_busy.get(runner, 0) + 1
+    try:
+        return execute(cmd, verbose)
+    except KeyboardInterrupt:
+        interrupt_tf_runners([runner])
+        raise
+    finally:
+        elapsed = time.time() - start
+        with _tf_runners_lock:
+            _tf_busy[runner] -= 1
+            _tf_stats["commands"] += 1
+            _tf_stats["command_seconds"] += elapsed
+            _tf_stats["verbose"] = _tf_stats["verbose"] or verbose
+        if verbose:
+            click.echo(
+                f"{get_log_prefix()}terraform {tf_cmd.strip()} took {elapsed:.1f}s"
+            )
+
 
+def relative_node_path(node_config, verbose=False):
     node_path = node_config["path"]
     curr_path = os.path.abspath(".")
     if curr_path not in node_path:
@@ -156,13 +379,47 @@ def build(node_config, node, verbose):
     path = node_path.replace(curr_path, ".").replace("\\", "/")
     if verbose:
         click.secho(f"Using relative path to node: {path}")
+    return path
+
+
+def build_args(node_config, node, path):
+    args = dict(load_or_init_keys()["numerai"])
+    args["MODEL_ID"] = node_config["model_id"]
+    args["SRC_PATH"] = path
+    args["NODE"] = node
+    if uses_base_image(f"{path}/Dockerfile"):
+        args[BASE_IMAGE_ARG] = base_image_ref(node_config)
+    return args
+
+
+def build(node_config, node, verbose, fingerprint=None, registry_cache=False):
+    """
+    Builds the node's image. With `registry_cache`, BuildKit layers are imported
+    from and exported to a cache tag in the node's own registry repo, so builds
+    on fresh machines reuse e.g. the pip install layers. This needs a prior login.
+    """
+    path = relative_node_path(node_config, verbose)
+    args = build_args(node_config, node, path)
+    if BASE_IMAGE_ARG in args and not registry_cache:
+        # the docker driver builds FROM the local image, the buildx builder
+        # used for registry caching pulls it from the registry instead
+        build_base_image(node_config, verbose)
 
     build_arg_str = ""
-    for arg in numerai_keys:
-        build_arg_str += f" --build-arg {arg}={numerai_keys[arg]}"
-    build_arg_str += f' --build-arg MODEL_ID={node_config["model_id"]}'
-    build_arg_str += f" --build-arg SRC_PATH={path}"
-    build_arg_str += f" --build-arg NODE={node}"
+    for arg, value in args.items():
+        build_arg_str += f" --build-arg {arg}={value}"
+    if fingerprint:
+        build_arg_str += f" --label {SOURCE_FINGERPRINT_LABEL}={fingerprint}"
+    if registry_cache:
+        ensure_buildx_builder(verbose)
+        cache_ref = f'{image_repository(node_config["docker_repo"])}:{BUILD_CACHE_TAG}'
+        build_arg_str += f" --builder {BUILDX_BUILDER}"
+        build_arg_str += f" --cache-from type=registry,ref={cache_ref}"
+        # ECR only accepts caches stored as OCI image manifests
+        build_arg_str += (
+            f" --cache-to type=registry,ref={cache_ref},mode=max,"
+            f"image-manifest=true,oci-mediatypes=true"
+        )
 
     cmd = (
         f'docker build --platform=linux/amd64 --load -t {node_config["docker_repo"]}'
@@ -177,25 +434,165 @@ def build(node_config, node, verbose):
         exit(1)
 
 
+def base_image_requirements():
+    """The union of the pinned requirements of every example"""
+    return merge_requirements(
+        sorted(glob.glob(os.path.join(EXAMPLE_PATH, "*", "requirements.txt")))
+    )
+
+
+def base_image_tag():
+    """Content tag of the base image, changes whenever its Dockerfile or requirements do"""
+    digest = hashlib.sha256()
+    with open(os.path.join(BASE_IMAGE_PATH, "Dockerfile"), "rb") as f:
+        digest.update(f.read())
+    digest.update("\n".join(base_image_requirements()).encode())
+    return digest.hexdigest()[:12]
+
+
+def base_image_ref(node_config):
+    """The base image in the registry of the node, next to the node's own repo"""
+    registry = image_repository(node_config["docker_repo"]).rpartition("/")[0]
+    return f"{registry}/{BASE_IMAGE_NAME}:{base_image_tag()}"
+
+
+def build_base_image(node_config, verbose):
+    """
+    Makes the base image available locally under the node's registry name,
+    building it only if no local image with the same content tag exists.
+    """
+    base_image = base_image_ref(node_config)
+    local_image = f"{BASE_IMAGE_NAME}:{base_image_tag()}"
+    with _base_image_lock:
+        if base_image in _built_base_images or base_image in _pushed_base_images:
+            return base_image
+        try:
+            execute(f"docker image inspect {local_image}", verbose)
+        except click.ClickException:
+            click.echo(f"{get_log_prefix()}building shared base image {local_image}...")
+            with tempfile.TemporaryDirectory() as context:
+                shutil.copy(os.path.join(BASE_IMAGE_PATH, "Dockerfile"), context)
+                with open(os.path.join(context, "requirements.txt"), "w") as f:
+                    f.write("\n".join(base_image_requirements()) + "\n")
+                execute(
+                    f"docker build --platform=linux/amd64 -t {local_image} {context}",
+                    verbose,
+                )
+        tag(local_image, base_image, verbose)
+        _built_base_images.add(base_image)
+    return base_image
+
+
+def push_base_image(node_config, verbose):
+    """
+    Pushes the base image to the node's registry unless it's already there.
+    Node images built on it then only push their own layers.
+    """
+    base_image = base_image_ref(node_config)
+    if base_image in _pushed_base_images:
+        return base_image
+    try:
+        manifest_inspect(base_image, verbose)
+    except click.ClickException:
+        build_base_image(node_config, verbose)
+        with _base_image_lock:
+            if base_image not in _pushed_base_images:
+                # the base repo is shared by all nodes, so terraform doesn't manage it
+                get_provider(node_config["provider"]).ensure_repository(
+                    node_config, BASE_IMAGE_NAME
+                )
+                click.echo(f"{get_log_prefix()}pushing shared base image {base_image}...")
+                push(base_image, verbose)
+                _pushed_base_images.add(base_image)
+        return base_image
+    _pushed_base_images.add(base_image)
+    return base_image
+
+
+def ensure_buildx_builder(verbose):
+    """Creates the docker-container buildx builder used for registry caching"""
+    with _builder_lock:
+        try:
+            execute(f"docker buildx inspect {BUILDX_BUILDER}", verbose)
+        except click.ClickException:
+            execute(
+                f"docker buildx create --name {BUILDX_BUILDER} --driver docker-container",
+                verbose,
+            )
+
+
+def image_repository(docker_image):
+    """Strips the tag from an image reference, registry ports are left alone"""
+    repository, _, tag = docker_image.rpartition(":")
+    if repository and "/" not in tag:
+        return repository
+    return docker_image
+
+
+def source_fingerprint(node_config, node):
+    """
+    Hashes everything that goes into a node's image: the build args, the
+    Dockerfile and the files its COPY and ADD instructions read from the build
+    context, minus those excluded by .dockerignore. The build context is the
+    current directory, which may hold other nodes, so if the sources can't be
+    worked out from the Dockerfile the node's own directory is hashed instead.
+    """
+    path = relative_node_path(node_config)
+    dockerfile_path = f"{path}/Dockerfile"
+    args = build_args(node_config, node, path)
+    digest = hashlib.sha256()
+    for arg, value in sorted(args.items()):
+        digest.update(f"{arg}={value}\0".encode())
+    with open(dockerfile_path, "rb") as f:
+        digest.update(f.read())
+    sources = dockerfile_sources(dockerfile_path, args)
+    if sources is None:
+        sources = [path]
+    rules = read_dockerignore(".", dockerfile_path)
+    hash_build_context(".", rules, digest, sources=sources)
+    return digest.hexdigest()
+
+
+def remote_source_fingerprint(docker_image, verbose):
+    """
+    Returns the source fingerprint label of an image in the remote registry,
+    without pulling it, or None if the image or label doesn't exist.
+    """
+    cmd = (
+        f"docker buildx imagetools inspect {docker_image}"
+        f' --format "{{{{json .Image.Config.Labels}}}}"'
+    )
+    try:
+        stdout, _ = execute(cmd, verbose)
+        labels = json.loads(stdout) or {}
+    except (click.ClickException, ValueError, AttributeError):
+        return None
+    if not isinstance(labels, dict):
+        return None
+    return labels.get(SOURCE_FINGERPRINT_LABEL)
+
+
 def run(node_config, verbose, command=""):
     cmd = f"docker run --rm -it {node_config['docker_repo']} {command}"
     execute(cmd, verbose)
 
 
 def login(node_config, verbose):
-    if node_config["provider"] == PROVIDER_AWS:
-        username, password = login_aws()
-        login_url = node_config['docker_repo']
-    elif node_config["provider"] == PROVIDER_AZURE:
-        username, password = login_azure(
-            node_config["registry_rg_name"], node_config["registry_name"]
-        )
-        login_url = node_config['docker_repo']
-    elif node_config["provider"] == PROVIDER_GCP:
-        username, password = login_gcp()
-        login_url = node_config['artifact_registry_login_url']
-    else:
-        raise ValueError(f"Unsupported provider: '{node_config['provider']}'")
+    """
+    Logs docker into the node's container registry. Logins are cached per
+    provider and registry until they expire, so repeated deploys skip both the
+    credential lookup and `docker login`.
+    """
+    provider = get_provider(node_config["provider"])
+    cache_key = login_cache_key(node_config)
+    logins = load_or_init_registry_logins()
+    if logins.get(cache_key, 0) > time.time() + LOGIN_EXPIRY_MARGIN_SECONDS:
+        if verbose:
+            click.echo(f"{get_log_prefix()}Reusing docker login for {cache_key}")
+        return
+
+    username, password, expires_at = provider.login(node_config)
+    login_url = provider.registry_url(node_config)
 
     if os.name == "nt":
         echo_cmd = f'echo | set /p="{password}"'
@@ -211,46 +608,42 @@ def login(node_config, verbose):
 
     execute(cmd, verbose, censor_substr=password)
 
+    with locked_registry_logins() as logins:
+        logins[cache_key] = expires_at
 
-def login_aws():
-    aws_public, aws_secret = get_aws_keys()
-    ecr_client = boto3.client(
-        "ecr",
-        region_name="us-east-1",
-        aws_access_key_id=aws_public,
-        aws_secret_access_key=aws_secret,
-    )
 
-    token = ecr_client.get_authorization_token()  # TODO: use registryIds
-    username, password = (
-        base64.b64decode(token["authorizationData"][0]["authorizationToken"])
-        .decode()
-        .split(":")
-    )
+def invalidate_login(node_config):
+    """Forgets the cached login of a node's registry, e.g. after a push was denied"""
+    with locked_registry_logins() as logins:
+        logins.pop(login_cache_key(node_config), None)
 
-    return username, password
 
+def login_cache_key(node_config):
+    provider = get_provider(node_config["provider"])
+    return f'{node_config["provider"]}:{provider.registry_url(node_config)}'
 
-def login_azure(resource_group_name, registry_name):
-    azure_subs_id, azure_client, azure_tenant, azure_secret = get_azure_keys()
-    credentials = ClientSecretCredential(
-        client_id=azure_client, tenant_id=azure_tenant, client_secret=azure_secret
-    )
-    username_password = ContainerRegistryManagementClient(
-        credentials, azure_subs_id
-    ).registries.list_credentials(resource_group_name, registry_name)
-    username = username_password.username
-    password = username_password.passwords[0].value
-    return username, password
 
+def load_or_init_registry_logins():
+    maybe_create(REGISTRY_LOGINS_PATH)
+    try:
+        return load_config(REGISTRY_LOGINS_PATH)
+    except ValueError:
+        return {}
 
-def login_gcp():
-    gcp_keys_path = get_gcp_keys()
-    gcp_keys_file = open(gcp_keys_path, "r")
-    gcp_keys = gcp_keys_file.read()
-    username = "_json_key_base64"
-    password = base64.b64encode(gcp_keys.encode()).decode("utf-8")
-    return username, password
+
+@contextmanager
+def locked_registry_logins():
+    """
+    Read-modify-write of the registry logins for concurrent CLI runs, like
+    files.locked_nodes: yields the logins while holding their lock, and
+    stores them on exit if changed.
+    """
+    with file_lock(REGISTRY_LOGINS_PATH):
+        logins = load_or_init_registry_logins()
+        original = dict(logins)
+        yield logins
+        if logins != original:
+            store_config(REGISTRY_LOGINS_PATH, logins)
 
 
 def manifest_inspect(docker_image, verbose):
@@ -274,109 +667,10 @@ def tag(original_image, new_image_tag, verbose):
 
 
 def cleanup(node_config):
-    provider = node_config["provider"]
-    if provider == PROVIDER_AWS:
-        imageIds = cleanup_aws(node_config["docker_repo"])
-    elif provider == PROVIDER_AZURE:
-        imageIds = cleanup_azure(node_config)
-    elif provider == PROVIDER_GCP:
-        imageIds = cleanup_gcp(node_config)
-    else:
-        raise ValueError(f"Unsupported provider: '{provider}'")
+    imageIds = get_provider(node_config["provider"]).cleanup(node_config)
 
     if len(imageIds) > 0:
         click.secho(
-            f"Deleted {str(len(imageIds))} old image(s) from remote docker repo",
+            f"{get_log_prefix()}Deleted {str(len(imageIds))} old image(s) from remote docker repo",
             fg="yellow",
         )
-
-
-def cleanup_aws(docker_repo):
-    aws_public, aws_secret = get_aws_keys()
-    ecr_client = boto3.client(
-        "ecr",
-        region_name="us-east-1",
-        aws_access_key_id=aws_public,
-        aws_secret_access_key=aws_secret,
-    )
-
-    docker_repo_name = docker_repo.split("/")[-1]
-
-    resp = ecr_client.list_images(
-        repositoryName=docker_repo_name, filter={"tagStatus": "UNTAGGED"}
-    )
-
-    imageIds = resp["imageIds"]
-    if len(imageIds) == 0:
-        return []
-
-    resp = ecr_client.batch_delete_image(
-        repositoryName=docker_repo_name, imageIds=imageIds
-    )
-
-    return resp["imageIds"]
-
-
-def cleanup_azure(node_config):
-    _, azure_client, azure_tenant, azure_secret = get_azure_keys()
-    credentials = ClientSecretCredential(
-        client_id=azure_client, tenant_id=azure_tenant, client_secret=azure_secret
-    )
-    acr_client = ContainerRegistryClient(node_config["acr_login_server"], credentials)
-    docker_repo = node_config["docker_repo"]
-    node_repo_name = [
-        repo_name
-        for repo_name in acr_client.list_repository_names()
-        if repo_name == docker_repo.split("/")[-1]
-    ][0]
-
-    # get all manifests, ordered by last update time
-    manifest_list = [
-        repo_detail
-        for repo_detail in acr_client.list_manifest_properties(
-            node_repo_name, order_by=ArtifactManifestOrder.LAST_UPDATED_ON_DESCENDING
-        )
-    ]
-    # Remove all but the latest manifest
-    removed_manifests = []
-    for manifest in manifest_list[1:]:
-        acr_client.update_manifest_properties(
-            node_repo_name, manifest.digest, can_write=True, can_delete=True
-        )
-        removed_manifests.append(manifest.digest)
-        acr_client.delete_manifest(node_repo_name, manifest.digest)
-    return removed_manifests
-
-
-def cleanup_gcp(node_config):
-    print(node_config)
-    gcp_key_path = get_gcp_keys()
-    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = gcp_key_path
-
-    node_name = node_config["docker_repo"].split("/")[-1]
-
-    client = artifactregistry_v1.ArtifactRegistryClient()
-    list_images_request = artifactregistry_v1.ListDockerImagesRequest(
-        parent=node_config["registry_id"]
-    )
-    page_result = client.list_docker_images(request=list_images_request)
-
-    latest_image_name = ""
-    for response in page_result:
-        if "latest" in response.tags:
-            latest_image_name = response.name
-
-    versions = artifactregistry_v1.ListVersionsRequest(
-        parent=f"{node_config['registry_id']}/packages/{node_name}"
-    )
-    page_result = client.list_versions(request=versions)
-    versions_to_delete = []
-    for response in page_result:
-        if response.metadata["name"] != latest_image_name:
-            versions_to_delete.append(response.name)
-
-    for version in versions_to_delete:
-        result = client.delete_version(name=version)
-
-    # Nothing to do
-    return versions_to_delete
@@ -1,5 +1,9 @@
+import copy
 import json
+import re
 import shutil
+import tempfile
+from contextlib import contextmanager
 
 import click
 
@@ -14,8 +18,59 @@ def load_config(path):
 
 
 def store_config(path, obj):
-    with open(path, "w+") as f:
-        json.dump(obj, f, indent=2)
+    """
+    Writes the JSON to a temp file next to `path` and swaps it in with
+    os.replace, so readers see either the old or the new file, never a
+    partial one. The permissions of an existing file are kept.
+    """
+    fd, tmp_path = tempfile.mkstemp(
+        prefix=f".{os.path.basename(path)}.",
+        suffix=".tmp",
+        dir=os.path.dirname(path) or ".",
+    )
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(obj, f, indent=2)
+        if os.path.exists(path):
+            shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+@contextmanager
+def file_lock(path):
+    """
+    Holds an exclusive lock on `<path>.lock` across processes (and threads,
+    each of which opens the lock file on its own) until the block exits.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.lock", "a+") as lock_file:
+        if os.name == "nt":
+            import msvcrt
+
+            lock_file.seek(0)
+            while True:
+                try:
+                    # LK_LOCK gives up after 10 seconds, keep waiting
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+            try:
+                yield
+            finally:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
 
 
 def maybe_create(path, protected=False):
@@ -28,10 +83,12 @@ def maybe_create(path, protected=False):
     if not os.path.exists(path):
         created = True
         if protected:
-            store_config(os.open(path, os.O_CREAT | os.O_WRONLY, 0o600), {})
+            with open(os.open(path, os.O_CREAT | os.O_WRONLY, 0o600), "w") as f:
+                json.dump({}, f)
             os.chmod(path, 0o600)
         else:
-            store_config(path, {})
+            with open(path, "w") as f:
+                json.dump({}, f)
 
     return created
 
@@ -50,6 +107,108 @@ def load_or_init_nodes(node=None):
         exit(1)
 
 
+@contextmanager
+def locked_nodes():
+    """
+    Read-modify-write of nodes.json for concurrent CLI runs: yields every node's
+    config while holding the nodes lock, and stores them on exit if changed.
+    """
+    with file_lock(NODES_PATH):
+        nodes_config = load_or_init_nodes()
+        original = copy.deepcopy(nodes_config)
+        yield nodes_config
+        if nodes_config != original:
+            store_config(NODES_PATH, nodes_config)
+            sync_provider_nodes(nodes_config)
+
+
+def provider_nodes(nodes_config, provider):
+    return {
+        node: config
+        for node, config in nodes_config.items()
+        if config and config.get("provider") == provider
+    }
+
+
+def sync_provider_nodes(nodes_config=None):
+    """
+    Derives each provider's view of nodes.json, holding only that provider's
+    nodes without their LOCAL_NODE_KEYS, in its terraform directory (PROVIDER_NODES_FILE), which is what
+    terraform reads. A view is only rewritten when its subset of nodes changed,
+    so unrelated providers never see a change. Returns the rewritten providers.
+    """
+    if nodes_config is None:
+        nodes_config = load_or_init_nodes()
+    rewritten = []
+    for provider in PROVIDERS:
+        provider_path = os.path.join(CONFIG_PATH, provider)
+        if not os.path.isdir(provider_path):
+            # terraform files for this provider haven't been set up
+            continue
+        view_path = os.path.join(provider_path, PROVIDER_NODES_FILE)
+        view = {
+            node: {
+                key: value for key, value in config.items() if key not in LOCAL_NODE_KEYS
+            }
+            for node, config in provider_nodes(nodes_config, provider).items()
+        }
+        try:
+            if load_config(view_path) == view:
+                continue
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+        store_config(view_path, view)
+        rewritten.append(provider)
+    return rewritten
+
+
+def update_node(node, values):
+    """Merges `values` into one node's config, returns the updated config"""
+    with locked_nodes() as nodes_config:
+        nodes_config.setdefault(node, {}).update(values)
+        return copy.deepcopy(nodes_config[node])
+
+
+def set_node(node, node_config):
+    """Replaces one node's config, leaving every other node as it is on disk"""
+    with locked_nodes() as nodes_config:
+        nodes_config[node] = copy.deepcopy(node_config)
+
+
+def remove_node(node):
+    """Removes one node's config, returns it or None if it wasn't configured"""
+    with locked_nodes() as nodes_config:
+        return nodes_config.pop(node, None)
+
+
+def without_applied_config(node_config):
+    """
+    Copy of a node's config without its APPLIED_CONFIG_KEY digest, for configs
+    kept while the node's cloud resources are destroyed, so that the next
+    `node config` applies them again instead of skipping terraform.
+    """
+    return {
+        key: value for key, value in node_config.items() if key != APPLIED_CONFIG_KEY
+    }
+
+
+def backup_nodes(nodes_config, verbose=True):
+    """Saves nodes_config, without applied config digests, to the nodes.json backup"""
+    backup_path = f"{NODES_PATH}.backup"
+    if not os.path.exists(backup_path):
+        os.mkdir(backup_path)
+    backup_file = os.path.join(backup_path, os.path.basename(NODES_PATH))
+    if verbose:
+        click.secho(f"copying file {backup_file}", fg="yellow")
+    store_config(
+        backup_file,
+        {
+            node: without_applied_config(node_config)
+            for node, node_config in nodes_config.items()
+        },
+    )
+
+
 def copy_file(src_file, dst_path, force=False, verbose=True):
     if not os.path.exists(dst_path):
         if verbose:
@@ -94,6 +253,12 @@ def copy_example(example, dest, verbose):
 
     click.echo(f"Copying {example} example to {dst_dir}")
     copy_files(example_dir, dst_dir, force=False, verbose=verbose)
+    if uses_base_image(os.path.join(dst_dir, "Dockerfile")):
+        click.echo(
+            f"This example builds on the shared {BASE_IMAGE_NAME} image, which "
+            f"already contains its requirements; only packages you add to "
+            f"requirements.txt are installed on top."
+        )
 
     dockerignore_path = os.path.join(dst_dir, ".dockerignore")
     if not os.path.exists(dockerignore_path):
@@ -130,3 +295,236 @@ def move_files(src, dst, verbose=False, exclude_files=[]):
             os.remove(src_path)
         if verbose:
             click.secho(f"Moved file: {src_path}")
+
+
+def uses_base_image(dockerfile_path):
+    """True if the Dockerfile takes the shared base image through BASE_IMAGE_ARG"""
+    if not os.path.exists(dockerfile_path):
+        return False
+    with open(dockerfile_path) as f:
+        return (
+            re.search(rf"^\s*ARG\s+{BASE_IMAGE_ARG}(=|\s|$)", f.read(), re.MULTILINE)
+            is not None
+        )
+
+
+def read_dockerignore(context_path, dockerfile_path):
+    """
+    Returns the parsed .dockerignore rules for a build as a list of
+    (compiled pattern, is_exception) tuples. Like docker, a
+    `<Dockerfile>.dockerignore` next to the Dockerfile takes precedence
+    over the `.dockerignore` at the root of the build context.
+    """
+    for ignore_path in [
+        f"{dockerfile_path}.dockerignore",
+        os.path.join(context_path, ".dockerignore"),
+    ]:
+        if os.path.exists(ignore_path):
+            with open(ignore_path) as f:
+                return parse_dockerignore(f.read().splitlines())
+    return []
+
+
+def parse_dockerignore(lines):
+    rules = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        is_exception = line.startswith("!")
+        pattern = os.path.normpath(line.lstrip("!").strip()).replace("\\", "/")
+        pattern = pattern.strip("/")
+        if pattern in ("", "."):
+            continue
+        # a pattern matching a directory also matches everything below it
+        rules.append((re.compile(f"^{glob_to_regex(pattern)}(/.*)?$"), is_exception))
+    return rules
+
+
+def glob_to_regex(pattern):
+    """Translates a .dockerignore glob, where only ** crosses directories"""
+    regex = ""
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith("**/", i):
+            regex += "(?:.*/)?"
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            regex += ".*"
+            i += 2
+            continue
+        if char == "*":
+            regex += "[^/]*"
+        elif char == "?":
+            regex += "[^/]"
+        elif char == "[":
+            end = pattern.find("]", i)
+            if end == -1:
+                regex += re.escape(char)
+            else:
+                regex += pattern[i : end + 1].replace("[!", "[^", 1)
+                i = end
+        else:
+            regex += re.escape(char)
+        i += 1
+    return regex
+
+
+def is_dockerignored(rel_path, rules):
+    ignored = False
+    for pattern, is_exception in rules:
+        if pattern.match(rel_path):
+            ignored = not is_exception
+    return ignored
+
+
+def dockerfile_sources(dockerfile_path, build_args):
+    """
+    Returns the local paths (relative to the build context, possibly with
+    wildcards) that the Dockerfile's COPY and ADD instructions read, with
+    `build_args` and ARG defaults substituted. Returns None if a source can't
+    be resolved, e.g. it uses a variable with no value or a `${VAR:-x}` form.
+    """
+    with open(dockerfile_path) as f:
+        # join continuation lines, comments can't be continued
+        lines = re.sub(r"\\[ \t]*\r?\n", " ", f.read()).splitlines()
+
+    variables = {}
+    sources = []
+    for line in lines:
+        words = line.strip().split(None, 1)
+        if len(words) < 2 or words[0].startswith("#"):
+            continue
+        instruction, rest = words[0].upper(), words[1].strip()
+        if instruction == "ARG":
+            name, _, default = rest.partition("=")
+            variables.setdefault(name.strip(), default.strip().strip("\"'"))
+            continue
+        if instruction not in ("COPY", "ADD"):
+            continue
+        if rest.startswith("<<"):
+            # heredocs are written inline, they read nothing from the context
+            continue
+        args = []
+        while rest.startswith("--"):
+            flag, _, rest = rest.partition(" ")
+            args.append(flag)
+            rest = rest.strip()
+        if any(flag.startswith("--from=") for flag in args):
+            # copies from another build stage or image
+            continue
+        if rest.startswith("["):
+            try:
+                paths = json.loads(rest)
+            except ValueError:
+                return None
+        else:
+            paths = rest.split()
+        for source in paths[:-1]:
+            if "://" in source or source.startswith("git@"):
+                continue
+            source = substitute_build_args(source, {**variables, **build_args})
+            if source is None:
+                return None
+            sources.append(source)
+    return sources
+
+
+def substitute_build_args(value, build_args):
+    """Expands $VAR and ${VAR} in a Dockerfile word, None if any can't be expanded"""
+    if re.search(r"\$\{\w+:", value):
+        return None
+    missing = []
+
+    def expand(match):
+        name = match.group(1) or match.group(2)
+        if not build_args.get(name):
+            missing.append(name)
+            return ""
+        return str(build_args[name])
+
+    value = re.sub(r"\$(?:\{(\w+)\}|(\w+))", expand, value)
+    return None if missing else value
+
+
+def hash_build_context(context_path, rules, digest, sources=None):
+    """
+    Feeds the path, executable bit and content of every file docker would send
+    as build context into `digest` (a hashlib object), in a stable order.
+    With `sources` (paths relative to the context, wildcards allowed, e.g.
+    from dockerfile_sources) only the files under those paths are hashed.
+    """
+    has_exceptions = any(is_exception for _, is_exception in rules)
+    if sources is not None:
+        sources = [
+            os.path.normpath(source).replace("\\", "/").strip("/")
+            for source in sources
+        ]
+        # the directory each source is in, up to its first wildcard
+        prefixes = [re.split(r"/?[^/]*[*?[]", source, 1)[0] for source in sources]
+        source_patterns = [
+            re.compile(f"^{glob_to_regex(source)}(/.*)?$") for source in sources
+        ]
+        if "." in sources:
+            sources = None
+    for root, dirs, filenames in os.walk(context_path):
+        rel_root = os.path.relpath(root, context_path).replace("\\", "/")
+        rel_root = "" if rel_root == "." else f"{rel_root}/"
+        dirs.sort()
+        if not has_exceptions:
+            # nothing below an ignored directory can be re-included
+            dirs[:] = [d for d in dirs if not is_dockerignored(rel_root + d, rules)]
+        if sources is not None:
+            # only walk directories leading to or inside of a source
+            dirs[:] = [
+                d
+                for d in dirs
+                if any(
+                    not prefix
+                    or f"{prefix}/".startswith(f"{rel_root}{d}/")
+                    or f"{rel_root}{d}/".startswith(f"{prefix}/")
+                    for prefix in prefixes
+                )
+            ]
+        for filename in sorted(filenames):
+            rel_path = rel_root + filename
+            if is_dockerignored(rel_path, rules):
+                continue
+            if sources is not None and not any(
+                pattern.match(rel_path) for pattern in source_patterns
+            ):
+                continue
+            file_path = os.path.join(root, filename)
+            digest.update(rel_path.encode() + b"\0")
+            if os.path.islink(file_path):
+                digest.update(b"link:" + os.readlink(file_path).encode())
+                continue
+            digest.update(b"x" if os.access(file_path, os.X_OK) else b"-")
+            with open(file_path, "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(block)
+            digest.update(b"\0")
+
+
+def merge_requirements(requirements_paths):
+    """
+    Merges pip requirements files into one sorted requirements list, keyed by
+    lower-cased package name. Raises ValueError when two files pin the same
+    package differently, since one image can't satisfy both.
+    """
+    merged = {}
+    for requirements_path in requirements_paths:
+        with open(requirements_path) as f:
+            for line in f:
+                requirement = line.split("#", 1)[0].strip()
+                if not requirement:
+                    continue
+                name = re.split(r"[\s\[<>=!~;@]", requirement, 1)[0].lower()
+                if merged.setdefault(name, requirement) != requirement:
+                    raise ValueError(
+                        f"Conflicting requirements for {name}: "
+                        f"'{merged[name]}' and '{requirement}' ({requirements_path})"
+                    )
+    return [merged[name] for name in sorted(merged)]
@@ -1,21 +1,15 @@
+import copy
 import json
+import re
+import threading
 from configparser import ConfigParser, MissingSectionHeaderError
 
-import boto3
 import click
 import shutil
-import numerapi
-
-
-from azure.identity import ClientSecretCredential  # DefaultAzureCredential
-from azure.mgmt.subscription import SubscriptionClient
-
-from google.oauth2 import service_account
-from google.cloud import storage
-
 
 from numerai.cli.constants import *
 from numerai.cli.constants import KEYS_PATH
+from numerai.cli.providers import get_provider
 from numerai.cli.util.debug import exception_with_msg
 from numerai.cli.util.files import load_or_init_nodes, store_config, maybe_create, load_config
 
@@ -48,27 +42,120 @@ def reformat_keys():
         pass
 
 
+class KeyStore:
+    """
+    Process-wide cache of the keys file. The file is parsed once and only
+    re-read when its mtime or size changes, e.g. after another process
+    rewrote it, so accessors called on every command are a single stat.
+    Updates are written through to the file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._keys = None
+        self._version = None
+        self._secrets = ()
+        self._patterns = {}
+        self._lock = threading.RLock()
+
+    def _file_version(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def keys(self):
+        """The cached keys, callers must not modify them (see update)"""
+        with self._lock:
+            version = self._file_version()
+            if self._keys is None or version is None or version != self._version:
+                maybe_create(self.path, protected=True)
+                try:
+                    keys = load_config(self.path)
+                except json.decoder.JSONDecodeError:
+                    reformat_keys()
+                    keys = load_config(self.path)
+                self._set(keys)
+            return self._keys
+
+    def _set(self, keys):
+        self._keys = keys
+        self._version = self._file_version()
+        self._secrets = tuple(
+            key
+            for key in self.aws()
+            + self.numerai()
+            + self.azure()
+            + tuple(keys.get("azure_storage", {}).values())
+            if isinstance(key, str) and key
+        )
+        self._patterns = {}
+
+    def update(self, provider, values):
+        """Merges `values` into the keys of one provider and saves the file"""
+        with self._lock:
+            keys = copy.deepcopy(self.keys())
+            keys.setdefault(provider, {}).update(values)
+            store_config(self.path, keys)
+            self._set(keys)
+
+    def _lookup(self, provider, *names):
+        keys = self.keys()
+        try:
+            return tuple(keys[provider][name] for name in names)
+        except KeyError:
+            return (None,) * len(names)
+
+    def numerai(self):
+        return self._lookup("numerai", "NUMERAI_PUBLIC_ID", "NUMERAI_SECRET_KEY")
+
+    def aws(self):
+        return self._lookup("aws", "AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY")
+
+    def azure(self):
+        return self._lookup(
+            "azure",
+            "ARM_SUBSCRIPTION_ID",
+            "ARM_CLIENT_ID",
+            "ARM_TENANT_ID",
+            "ARM_CLIENT_SECRET",
+        )
+
+    def azure_storage_key(self, account_name):
+        """Access key of a storage account cached while monitoring Azure nodes"""
+        return self.keys().get("azure_storage", {}).get(account_name)
+
+    def gcp_keys_path(self):
+        return self._lookup("gcp", "GCP_KEYS_PATH")[0]
+
+    def secrets(self):
+        """Every configured key that sanitize_message censors"""
+        with self._lock:
+            self.keys()
+            return self._secrets
+
+    def secrets_pattern(self, binary=False):
+        """secrets() compiled into one matcher, see compile_secrets"""
+        with self._lock:
+            self.keys()
+            if binary not in self._patterns:
+                self._patterns[binary] = compile_secrets(self._secrets, binary)
+            return self._patterns[binary]
+
+
+key_store = KeyStore(KEYS_PATH)
+
+
 def load_or_init_keys(provider=None):
-    maybe_create(KEYS_PATH, protected=True)
-    try:
-        cfg = load_config(KEYS_PATH)
-    except json.decoder.JSONDecodeError as e:
-        reformat_keys()
-        cfg = load_config(KEYS_PATH)
+    cfg = copy.deepcopy(key_store.keys())
     if provider:
         return cfg[provider]
     return cfg
 
 
 def get_numerai_keys():
-    keys = load_or_init_keys()
-    try:
-        return (
-            keys["numerai"]["NUMERAI_PUBLIC_ID"],
-            keys["numerai"]["NUMERAI_SECRET_KEY"],
-        )
-    except KeyError:
-        return None, None
+    return key_store.numerai()
 
 
 def prompt_for_key(name, default):
@@ -86,14 +173,15 @@ def config_numerai_keys():
     numerai_secret = prompt_for_key("NUMERAI_SECRET_KEY", numerai_secret)
     check_numerai_validity(numerai_public, numerai_secret)
 
-    keys_config = load_or_init_keys()
-    keys_config.setdefault("numerai", {})
-    keys_config["numerai"]["NUMERAI_PUBLIC_ID"] = numerai_public
-    keys_config["numerai"]["NUMERAI_SECRET_KEY"] = numerai_secret
-    store_config(KEYS_PATH, keys_config)
+    key_store.update(
+        "numerai",
+        {"NUMERAI_PUBLIC_ID": numerai_public, "NUMERAI_SECRET_KEY": numerai_secret},
+    )
 
 
 def check_numerai_validity(key_id, secret):
+    import numerapi
+
     try:
         napi = numerapi.NumerAPI(key_id, secret)
         napi.get_account()
@@ -107,33 +195,15 @@ def get_provider_keys(node):
 
 
 def get_aws_keys():
-    keys = load_or_init_keys()
-    try:
-        return keys["aws"]["AWS_ACCESS_KEY_ID"], keys["aws"]["AWS_SECRET_ACCESS_KEY"]
-    except KeyError:
-        return None, None
+    return key_store.aws()
 
 
 def get_azure_keys():
-    keys = load_or_init_keys()
-    try:
-        return (
-            keys["azure"]["ARM_SUBSCRIPTION_ID"],
-            keys["azure"]["ARM_CLIENT_ID"],
-            keys["azure"]["ARM_TENANT_ID"],
-            keys["azure"]["ARM_CLIENT_SECRET"],
-        )
-
-    except KeyError:
-        return None, None, None, None
+    return key_store.azure()
 
 
 def get_gcp_keys():
-    keys = load_or_init_keys()
-    try:
-        return keys["gcp"]["GCP_KEYS_PATH"]
-    except KeyError:
-        return None
+    return key_store.gcp_keys_path()
 
 
 def get_gcp_project():
@@ -146,13 +216,11 @@ def config_aws_keys():
     aws_public, aws_secret = get_aws_keys()
     aws_public = prompt_for_key("AWS_ACCESS_KEY_ID", aws_public)
     aws_secret = prompt_for_key("AWS_SECRET_ACCESS_KEY", aws_secret)
-    check_aws_validity(aws_public, aws_secret)
+    get_provider(PROVIDER_AWS).check_validity(aws_public, aws_secret)
 
-    keys_config = load_or_init_keys()
-    keys_config.setdefault("aws", {})
-    keys_config["aws"]["AWS_ACCESS_KEY_ID"] = aws_public
-    keys_config["aws"]["AWS_SECRET_ACCESS_KEY"] = aws_secret
-    store_config(KEYS_PATH, keys_config)
+    key_store.update(
+        "aws", {"AWS_ACCESS_KEY_ID": aws_public, "AWS_SECRET_ACCESS_KEY": aws_secret}
+    )
 
 
 def config_azure_keys():
@@ -161,17 +229,21 @@ def config_azure_keys():
     azure_client = prompt_for_key("Azure Client ID [ARM_CLIENT_ID]", azure_client)
     azure_tenant = prompt_for_key("Azure Tenant ID [ARM_TENANT_ID]", azure_tenant)
     azure_secret = prompt_for_key("Azure Client Secret [ARM_CLIENT_SECRET]", azure_secret)
-    check_azure_validity(azure_subs_id, azure_client, azure_tenant, azure_secret)
+    get_provider(PROVIDER_AZURE).check_validity(
+        azure_subs_id, azure_client, azure_tenant, azure_secret
+    )
 
-    keys_config = load_or_init_keys()
-    keys_config.setdefault("azure", {})
     # Renaming the keys to match the environment variables that TF would recognize
     # https://developer.hashicorp.com/terraform/language/settings/backends/azurerm#environment
-    keys_config["azure"]["ARM_SUBSCRIPTION_ID"] = azure_subs_id
-    keys_config["azure"]["ARM_CLIENT_ID"] = azure_client
-    keys_config["azure"]["ARM_TENANT_ID"] = azure_tenant
-    keys_config["azure"]["ARM_CLIENT_SECRET"] = azure_secret
-    store_config(KEYS_PATH, keys_config)
+    key_store.update(
+        "azure",
+        {
+            "ARM_SUBSCRIPTION_ID": azure_subs_id,
+            "ARM_CLIENT_ID": azure_client,
+            "ARM_TENANT_ID": azure_tenant,
+            "ARM_CLIENT_SECRET": azure_secret,
+        },
+    )
 
 
 def config_gcp_keys():
@@ -183,82 +255,9 @@ def config_gcp_keys():
     if gcp_keys_path_new != gcp_keys_path:
         shutil.copy(gcp_keys_path_new, GCP_KEYS_PATH)
 
-    check_gcp_validity()
-
-    keys_config = load_or_init_keys()
-    keys_config.setdefault("gcp", {})
-    keys_config["gcp"]["GCP_KEYS_PATH"] = GCP_KEYS_PATH
-    store_config(KEYS_PATH, keys_config)
-
+    get_provider(PROVIDER_GCP).check_validity()
 
-def check_aws_validity(key_id, secret):
-    try:
-        client = boto3.client("s3", aws_access_key_id=key_id, aws_secret_access_key=secret)
-        client.list_buckets()
-    except Exception as e:
-        if "NotSignedUp" in str(e):
-            raise exception_with_msg(
-                f"Your AWS keys are valid, but the account is not finished signing up. "
-                f"You either need to update your credit card in AWS at "
-                f"https://portal.aws.amazon.com/billing/signup?type=resubscribe#/resubscribed, "
-                f"or wait up to 24 hours for their verification process to complete."
-            )
-
-        raise exception_with_msg(
-            f"AWS keys seem to be invalid. Make sure you've entered them correctly "
-            f"and that your user has the necessary permissions (for help, see "
-            f"https://github.com/numerai/numerai-cli/wiki/Amazon-Web-Services)."
-        )
-
-
-def check_azure_validity(subs_id, client_id, tenant_id, secret):
-    try:
-        credentials = ClientSecretCredential(client_id=client_id, tenant_id=tenant_id, client_secret=secret)
-        sub_client = SubscriptionClient(credentials)
-        subs = [sub.as_dict() for sub in sub_client.subscriptions.list()]
-        all_subs_ids = [subs_details["subscription_id"] for subs_details in subs]
-        if subs_id not in all_subs_ids:
-            raise Exception("Invalid Subscription ID")
-
-    except Exception as e:
-        error_msg = (
-            f"Make sure you follow the instructions in the wiki page: "
-            + f"https://github.com/numerai/numerai-cli/blob/master/docs/azure_setup_guide.md"
-            + f"to set up the Client ID, Tenant ID and Client Secret correctly."
-        )
-        if "AADSTS700016" in str(e):
-            raise exception_with_msg(f"Invalid Client ID. " + error_msg)
-        elif "double check your tenant name" in str(e):
-            raise exception_with_msg(f"Invalid Tenant ID. " + error_msg)
-        elif "Invalid client secret" in str(e):
-            raise exception_with_msg(f"Invalid Client Secret. " + error_msg)
-        elif "Invalid Subscription ID" in str(e):
-            raise exception_with_msg(
-                f"Azure Subscription ID is invalid, or IAM is NOT set up correctly. "
-                + f"Your Azure Client ID, Tenant ID and Client Secret are valid. "
-                + f"Make sure to follow the instructions in the wiki page: "
-                + f"https://github.com/numerai/numerai-cli/blob/master/docs/azure_setup_guide.md"
-            )
-
-
-def check_gcp_validity():
-    try:
-        credentials = service_account.Credentials.from_service_account_file(
-            GCP_KEYS_PATH
-        )
-        client = storage.Client(credentials=credentials)
-        response = client.list_buckets()
-        print(response)
-    except Exception as e:
-        error_msg = (
-            f"Make sure you follow the instructions in the wiki page: "
-            + f"https://github.com/numerai/numerai-cli/blob/master/docs/gcp_setup_guide.md"
-            + f"to set up the keys file correctly."
-        )
-        if "Request had invalid authentication credentials." in str(e):
-            raise exception_with_msg(f"Invalid credentials. " + error_msg)
-        else:
-            raise e
+    key_store.update("gcp", {"GCP_KEYS_PATH": GCP_KEYS_PATH})
 
 
 def config_provider_keys(cloud_provider):
@@ -270,16 +269,48 @@ def config_provider_keys(cloud_provider):
         config_gcp_keys()
 
 
+def compile_secrets(secrets, binary=False):
+    """
+    Compiles secrets into a single alternation, longest first so a secret that
+    contains another one is censored whole. Returns None if there are none.
+    """
+    secrets = sorted(set(secrets), key=len, reverse=True)
+    if not secrets:
+        return None
+    if binary:
+        return re.compile(b"|".join(re.escape(secret.encode()) for secret in secrets))
+    return re.compile("|".join(re.escape(secret) for secret in secrets))
+
+
+def censor(match):
+    secret = match.group()
+    if isinstance(secret, bytes):
+        return b"..." + secret[-5:]
+    return f"...{secret[-5:]}"
+
+
+def secrets_pattern(censor_substr=None, binary=False):
+    if censor_substr:
+        return compile_secrets(key_store.secrets() + (censor_substr,), binary)
+    return key_store.secrets_pattern(binary)
+
+
 def sanitize_message(message, censor_substr=None):
     if message is None:
         return None
-    all_keys = get_aws_keys() + get_numerai_keys() + get_azure_keys()
-    for key in all_keys:
-        if key:
-            try:
-                message = message.replace(key, f"...{key[-5:]}")
-            except AttributeError:
-                continue
-    if censor_substr:
-        message = message.replace(censor_substr, f"...{censor_substr[-5:]}")
-    return message
+    pattern = secrets_pattern(censor_substr)
+    if pattern is None:
+        return message
+    return pattern.sub(censor, message)
+
+
+def line_redactor(censor_substr=None):
+    """
+    Returns a function censoring every known secret (and `censor_substr`) in a
+    line of subprocess output given as bytes. The matcher is compiled once, so
+    redacting costs a single regex scan per line.
+    """
+    pattern = secrets_pattern(censor_substr, binary=True)
+    if pattern is None:
+        return lambda line: line
+    return lambda line: pattern.sub(censor, line)
@@ -0,0 +1,166 @@
+"""Polling engine shared by the providers' node monitoring"""
+
+import heapq
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+
+from numerai.cli.constants import (
+    MONITOR_TIMEOUT_SECONDS,
+    MONITOR_POLL_INITIAL_SECONDS,
+    MONITOR_POLL_MAX_SECONDS,
+    MONITOR_POLL_BACKOFF,
+)
+
+
+class Probe:
+    """
+    What the monitor polls for a single node, implemented by each provider.
+
+    `status` returns a (done, message, color) tuple for the job being watched.
+    `logs` prints any log lines written since its last call and returns how
+    many it printed, or None if the probe doesn't follow logs or there is no
+    job to follow logs of (then no log grace period applies either). Both are
+    called concurrently, so `logs` follows whatever job `status` found last.
+    `close` is called once monitoring is over.
+    """
+
+    def status(self):
+        raise NotImplementedError
+
+    def logs(self):
+        return None
+
+    def close(self):
+        pass
+
+
+def poll_intervals(
+    initial=MONITOR_POLL_INITIAL_SECONDS,
+    maximum=MONITOR_POLL_MAX_SECONDS,
+    backoff=MONITOR_POLL_BACKOFF,
+):
+    """
+    Yields the delays between polls: exponential backoff from `initial` up to
+    `maximum`, each jittered down by up to half so concurrent monitors spread
+    out their API calls.
+    """
+    delay = initial
+    while True:
+        yield random.uniform(delay / 2, delay)
+        delay = min(delay * backoff, maximum)
+
+
+def watch(probe, timeout=MONITOR_TIMEOUT_SECONDS, log_grace=0):
+    """
+    Polls `probe` until its job is done or `timeout` seconds have passed.
+    Status and logs are fetched concurrently, and polling speeds back up
+    whenever the status changes or new log lines show up.
+
+    Args:
+        probe (Probe): the provider's probe for the node
+        timeout (int, optional): seconds before giving up on the job
+        log_grace (int, optional): seconds to keep polling for logs when the
+            job finished before any of its logs were printed
+
+    Returns:
+        bool: True if the job finished, False on timeout
+    """
+    try:
+        return _watch(probe, timeout, log_grace)
+    finally:
+        probe.close()
+
+
+def _watch(probe, timeout, log_grace):
+    deadline = time.monotonic() + timeout
+    intervals = poll_intervals()
+    last_message = None
+    log_lines = 0
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        while True:
+            status = executor.submit(probe.status)
+            logs = executor.submit(probe.logs)
+            new_lines = logs.result()
+            done, message, color = status.result()
+
+            progressed = bool(new_lines)
+            log_lines += new_lines or 0
+            if message != last_message:
+                click.secho(message, fg=color)
+                last_message = message
+                progressed = True
+            if done:
+                break
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            if progressed:
+                intervals = poll_intervals()
+            time.sleep(min(next(intervals), remaining))
+
+    # the job may have written more logs since they were last fetched
+    new_lines = probe.logs()
+    if new_lines is None:
+        return True
+    log_lines += new_lines
+    if log_lines > 0 or log_grace <= 0:
+        return True
+
+    click.secho(
+        "Node executed successfully, but there are no logs yet.\n"
+        f"You can safely exit at this time, or the CLI will try to collect logs "
+        f"for the next {log_grace} seconds.",
+        fg="yellow",
+    )
+    grace_deadline = time.monotonic() + log_grace
+    intervals = poll_intervals()
+    while log_lines == 0:
+        remaining = grace_deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        time.sleep(min(next(intervals), remaining))
+        log_lines += probe.logs() or 0
+    return True
+
+
+class LogCursor:
+    """
+    Resumable position in a log whose entries are ordered by timestamp only,
+    without a monotonic id to resume from. Entries can also show up after
+    newer ones, so reads resume `overlap` behind the newest timestamp seen
+    and entries read inside that window are skipped by their key.
+    """
+
+    def __init__(self, since, overlap):
+        self.watermark = since
+        self.overlap = overlap
+        # keys of the entries read within the overlap
+        self.seen = set()
+        # heap of (timestamp, order read, key) of the entries in `seen`
+        self.expiry = []
+        self.read = 0
+
+    @property
+    def resume_from(self):
+        """Timestamp the next read should start at (inclusive)"""
+        return self.watermark - self.overlap
+
+    def accept(self, key, timestamp):
+        """Records an entry, returns False if it was already read or is too old"""
+        if timestamp < self.resume_from or key in self.seen:
+            return False
+        self.seen.add(key)
+        heapq.heappush(self.expiry, (timestamp, self.read, key))
+        self.read += 1
+        if timestamp > self.watermark:
+            self.watermark = timestamp
+            # entries that fell out of the overlap can't be read again
+            horizon = self.resume_from
+            while self.expiry[0][0] < horizon:
+                self.seen.discard(heapq.heappop(self.expiry)[2])
+        return True
@@ -0,0 +1,210 @@
+"""Streaming subprocess runner used to execute docker and terraform commands"""
+
+import os
+import selectors
+import signal
+import subprocess
+import sys
+import tempfile
+from collections import deque
+from queue import Queue
+from threading import Thread
+
+from numerai.cli.constants import LOGS_PATH, OUTPUT_TAIL_BYTES
+
+READ_SIZE = 64 * 1024
+STDOUT = "stdout"
+STDERR = "stderr"
+
+
+class OutputCapture:
+    """
+    Accumulates the output of one subprocess stream with bounded memory: the
+    last `tail_bytes` are kept in memory, anything older is appended to a log
+    file under LOGS_PATH which is only created once the tail overflows. Lines
+    are passed through `redact` (if given) before they are written there.
+    """
+
+    def __init__(self, name, tail_bytes=OUTPUT_TAIL_BYTES, redact=None):
+        self.name = name
+        self.tail_bytes = tail_bytes
+        self.redact = redact
+        self.total_bytes = 0
+        self.spill_path = None
+        self._tail = deque()
+        self._tail_size = 0
+        self._spill_file = None
+
+    def append(self, line):
+        self._tail.append(line)
+        self._tail_size += len(line)
+        self.total_bytes += len(line)
+        while self._tail_size > self.tail_bytes and len(self._tail) > 1:
+            oldest = self._tail.popleft()
+            self._tail_size -= len(oldest)
+            self._spill(oldest)
+
+    def _spill(self, line):
+        if self._spill_file is None:
+            os.makedirs(LOGS_PATH, exist_ok=True)
+            fd, self.spill_path = tempfile.mkstemp(
+                prefix=f"{self.name}-", suffix=".log", dir=LOGS_PATH
+            )
+            self._spill_file = os.fdopen(fd, "wb")
+        if self.redact is not None:
+            line = self.redact(line)
+        self._spill_file.write(line)
+
+    @property
+    def spilled(self):
+        return self.spill_path is not None
+
+    def getvalue(self):
+        """The in-memory tail, which is the complete output unless it spilled"""
+        return b"".join(self._tail)
+
+    def close(self, keep_spill=False):
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+            if not keep_spill:
+                os.remove(self.spill_path)
+                self.spill_path = None
+
+
+def run_streaming(command, on_line=None, tail_bytes=OUTPUT_TAIL_BYTES, redact=None):
+    """
+    Runs a shell command and streams its stdout and stderr as they are produced.
+    The caller blocks on the pipes instead of polling, so no CPU is used while
+    the child is quiet.
+
+    Args:
+        command (string): shell command to run
+        on_line (callable, optional): called as on_line(stream_name, line) for
+            every line read, where stream_name is STDOUT or STDERR and line is
+            the raw bytes including the trailing newline. Returning True from
+            the callback kills the process and stops reading its output.
+        tail_bytes (int, optional): bytes of each stream to keep in memory.
+        redact (callable, optional): applied to each line of output written to
+            a spill file, e.g. a keys.line_redactor.
+
+    Returns:
+        tuple: (returncode, stdout OutputCapture, stderr OutputCapture),
+        the caller is responsible for closing the captures.
+    """
+    on_posix = "posix" in sys.builtin_module_names
+    # the command runs in its own process group so that killing it also kills
+    # whatever the shell started, e.g. every process of a pipeline
+    if on_posix:
+        group_kwargs = {"start_new_session": True}
+    else:
+        group_kwargs = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    proc = subprocess.Popen(
+        command,
+        shell=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        close_fds=on_posix,
+        **group_kwargs,
+    )
+    captured = {
+        STDOUT: OutputCapture(STDOUT, tail_bytes, redact),
+        STDERR: OutputCapture(STDERR, tail_bytes, redact),
+    }
+
+    def handle_line(stream_name, line):
+        captured[stream_name].append(line)
+        if on_line is not None:
+            return on_line(stream_name, line)
+        return False
+
+    try:
+        if on_posix:
+            stopped = _multiplex_selectors(proc, handle_line)
+        else:
+            stopped = _multiplex_threads(proc, handle_line)
+        if stopped:
+            kill_process_group(proc)
+        returncode = proc.wait()
+    finally:
+        if proc.poll() is None:
+            kill_process_group(proc)
+
+    return returncode, captured[STDOUT], captured[STDERR]
+
+
+def kill_process_group(proc):
+    """Kills a process started by run_streaming along with all its children"""
+    if "posix" in sys.builtin_module_names:
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    else:
+        subprocess.run(
+            ["taskkill", "/F", "/T", "/PID", str(proc.pid)],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+
+def _multiplex_selectors(proc, handle_line):
+    selector = selectors.DefaultSelector()
+    selector.register(proc.stdout, selectors.EVENT_READ, STDOUT)
+    selector.register(proc.stderr, selectors.EVENT_READ, STDERR)
+    partial = {STDOUT: b"", STDERR: b""}
+
+    try:
+        while selector.get_map():
+            for key, _ in selector.select():
+                stream_name = key.data
+                chunk = os.read(key.fd, READ_SIZE)
+                if not chunk:
+                    selector.unregister(key.fileobj)
+                    key.fileobj.close()
+                    if partial[stream_name] and handle_line(
+                        stream_name, partial[stream_name]
+                    ):
+                        return True
+                    continue
+                *lines, partial[stream_name] = (partial[stream_name] + chunk).split(
+                    b"\n"
+                )
+                for line in lines:
+                    if handle_line(stream_name, line + b"\n"):
+                        return True
+        return False
+    finally:
+        selector.close()
+
+
+def _multiplex_threads(proc, handle_line):
+    # select() only supports sockets on Windows, so read each pipe on its own
+    # thread and block on a queue until both streams are exhausted
+    queue = Queue()
+
+    def read_stream(stream, stream_name):
+        for line in iter(stream.readline, b""):
+            queue.put((stream_name, line))
+        stream.close()
+        queue.put((stream_name, None))
+
+    threads = [
+        Thread(target=read_stream, args=(proc.stdout, STDOUT), daemon=True),
+        Thread(target=read_stream, args=(proc.stderr, STDERR), daemon=True),
+    ]
+    for thread in threads:
+        thread.start()
+
+    open_streams = len(threads)
+    while open_streams:
+        stream_name, line = queue.get()
+        if line is None:
+            open_streams -= 1
+        elif handle_line(stream_name, line):
+            # the reader threads finish on their own once the process is killed
+            return True
+
+    for thread in threads:
+        thread.join()
+    return False
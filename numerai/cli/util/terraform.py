@@ -1,29 +1,78 @@
+import glob
+import hashlib
 import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from numerai.cli.constants import PROVIDERS, NODES_PATH
+from numerai.cli.constants import (
+    PROVIDERS,
+    NODES_PATH,
+    CONFIG_PATH,
+    PROVIDER_NODES_FILE,
+    TF_INIT_PATH,
+    TERRAFORM_VERSION,
+    LOCAL_NODE_KEYS,
+)
 from numerai.cli.util.docker import terraform
 from numerai.cli.util import docker
-from numerai.cli.util.files import load_or_init_nodes, store_config
+from numerai.cli.util.debug import exception_with_msg
+from numerai.cli.util.files import (
+    load_config,
+    load_or_init_nodes,
+    locked_nodes,
+    maybe_create,
+    provider_nodes,
+    store_config,
+    sync_provider_nodes,
+)
 from numerai.cli.util.keys import load_or_init_keys
 
 import click
 
+# saved plan file, relative to the provider directory
+TF_PLAN_FILE = "numerai.tfplan"
 
-def apply_terraform(nodes_config, affected_providers, provider, verbose):
-    # Apply terraform for any affected provider
+
+def apply_terraform(
+    nodes_config,
+    affected_providers,
+    provider,
+    verbose,
+    previous_nodes_config=None,
+    changed_nodes=None,
+):
+    """
+    Applies terraform for every affected provider. When the nodes.json from
+    before the change and the changed nodes are given, each provider only
+    applies the resources of those nodes (see node_targets), unless the change
+    touches resources shared by all of the provider's nodes. Each provider is
+    planned once into a saved plan which is then applied as is.
+
+    Returns True once the terraform outputs are saved to nodes.json.
+    """
     for affected_provider in affected_providers:
-        if affected_provider in PROVIDERS:
-            click.secho(f"Updating resources in {affected_provider}")
-            terraform(
-                "apply -auto-approve",
-                verbose,
-                affected_provider,
-                env_vars=load_or_init_keys(affected_provider),
-                inputs={"node_config_file": "../nodes.json"},
-            )
-        else:
+        if affected_provider not in PROVIDERS:
             click.secho(f"provider {affected_provider} not supported", fg="red")
             exit(1)
+
+    provider_targets = {}
+    if previous_nodes_config is not None and changed_nodes is not None:
+        for affected_provider in affected_providers:
+            provider_targets[affected_provider] = targeted_addresses(
+                affected_provider, changed_nodes, previous_nodes_config, nodes_config
+            )
+    terraform_providers(
+        "apply -auto-approve",
+        {
+            affected_provider: load_or_init_keys(affected_provider)
+            for affected_provider in affected_providers
+        },
+        verbose,
+        "Updating resources in",
+        provider_targets,
+        saved_plan=True,
+    )
     click.secho("cloud resources created successfully", fg="green")
 
     # terraform output for node config, same for aws and azure
@@ -34,24 +83,297 @@ def apply_terraform(nodes_config, affected_providers, provider, verbose):
         nodes = json.loads(res)
     except json.JSONDecodeError:
         click.secho("failed to save node configuration, please retry.", fg="red")
-        return
-    for node_name, data in nodes.items():
-        nodes_config[node_name].update(data)
-
-    store_config(NODES_PATH, nodes_config)
+        return False
+    with locked_nodes() as stored_nodes:
+        for node_name, data in nodes.items():
+            # nodes removed meanwhile by another CLI run aren't brought back
+            if node_name in stored_nodes:
+                stored_nodes[node_name].update(data)
+            if node_name in nodes_config:
+                nodes_config[node_name].update(data)
     if verbose:
         click.secho(f"new config:\n{json.dumps(load_or_init_nodes(), indent=2)}")
+    return True
+
+
+def applied_config_digest(node_config):
+    """
+    Hash of what terraform provisions a node from: its settings, the
+    terraform files of its provider and the terraform version. Recorded under
+    APPLIED_CONFIG_KEY once `node config` succeeds so that re-running it
+    with the same settings can skip terraform, while terraform files updated
+    by `numerai setup` still get applied. Settings only used locally are
+    left out.
+    """
+    settings = {
+        key: value
+        for key, value in node_config.items()
+        if key not in LOCAL_NODE_KEYS
+    }
+    digest = hashlib.sha256(json.dumps(settings, sort_keys=True).encode())
+    digest.update(f"\0{TERRAFORM_VERSION}\0".encode())
+    provider_path = os.path.join(CONFIG_PATH, node_config["provider"])
+    tf_paths = glob.glob(os.path.join(provider_path, "**", "*.tf"), recursive=True)
+    for tf_path in sorted(tf_paths):
+        # the .terraform directory holds downloaded modules, not our files
+        rel_path = os.path.relpath(tf_path, provider_path).replace("\\", "/")
+        if rel_path.startswith(".terraform/"):
+            continue
+        digest.update(rel_path.encode() + b"\0")
+        with open(tf_path, "rb") as f:
+            digest.update(f.read() + b"\0")
+    return digest.hexdigest()
+
+
+def plan_and_apply(provider, env_vars, target_args, verbose):
+    """
+    Saves a plan to TF_PLAN_FILE and applies it, returns the apply's output
+    or None if there was nothing to change.
+    """
+    plan = terraform(
+        f"plan -input=false -out={TF_PLAN_FILE}" + target_args,
+        verbose,
+        provider,
+        env_vars=env_vars,
+        inputs={"node_config_file": PROVIDER_NODES_FILE},
+    )
+    if b"No changes." in plan:
+        click.secho(f"{docker.get_log_prefix()}no changes to apply")
+        return None
+    # variables are baked into the saved plan, terraform rejects -var here
+    return terraform(
+        f"apply -auto-approve {TF_PLAN_FILE}",
+        verbose,
+        provider,
+        env_vars,
+        refresh_on_missing=False,
+    )
+
+
+def terraform_providers(
+    tf_cmd,
+    provider_env_vars,
+    verbose,
+    message,
+    provider_targets=None,
+    saved_plan=False,
+):
+    """
+    Runs a terraform command against the nodes.json of several providers at
+    once. Each provider directory has its own state, so the runs don't depend
+    on each other. Output is prefixed with the provider, and if any run fails
+    the others still finish before one error listing every failure is raised.
+
+    Args:
+        tf_cmd (string): terraform command, e.g. "apply -auto-approve"
+        provider_env_vars (dict): provider name -> env vars (keys) for that run
+        verbose (bool): stream terraform output
+        message (string): echoed before each provider's run, followed by its name
+        provider_targets (dict, optional): provider name -> -target addresses
+            the run is limited to, None (or no entry) runs against everything
+        saved_plan (bool, optional): for applies, write the plan to TF_PLAN_FILE
+            first and apply that file, skipping the apply if nothing changes
+    """
+    provider_targets = provider_targets or {}
+    sync_provider_nodes()
+
+    def run(provider, env_vars):
+        targets = provider_targets.get(provider)
+        with docker.log_prefix(f"[{provider}] "):
+            click.secho(f"{docker.get_log_prefix()}{message} {provider}")
+            target_args = ""
+            if targets == []:
+                click.secho(f"{docker.get_log_prefix()}no node resources to change")
+                return
+            if targets is not None:
+                click.secho(
+                    f"{docker.get_log_prefix()}only targeting "
+                    f"{len(targets)} resource(s) of the changed node(s)"
+                )
+                for target in targets:
+                    escaped = target.replace('"', '\\"')
+                    target_args += f' -target="{escaped}"'
+            if not saved_plan:
+                terraform(
+                    tf_cmd + target_args,
+                    verbose,
+                    provider,
+                    env_vars=env_vars,
+                    inputs={"node_config_file": PROVIDER_NODES_FILE},
+                )
+                return
+            try:
+                applied = plan_and_apply(provider, env_vars, target_args, verbose)
+                # if user accidentally deleted a resource, refresh terraform and
+                # plan again, the saved plan is stale once the state is refreshed
+                if applied is not None and docker.resources_missing(applied):
+                    terraform(
+                        "refresh",
+                        verbose,
+                        provider,
+                        env_vars=env_vars,
+                        inputs={"node_config_file": PROVIDER_NODES_FILE},
+                    )
+                    plan_and_apply(provider, env_vars, target_args, verbose)
+            finally:
+                try:
+                    os.remove(os.path.join(CONFIG_PATH, provider, TF_PLAN_FILE))
+                except FileNotFoundError:
+                    pass
+
+    errors = {}
+    with ThreadPoolExecutor(max_workers=max(len(provider_env_vars), 1)) as pool:
+        futures = {
+            pool.submit(run, provider, env_vars): provider
+            for provider, env_vars in provider_env_vars.items()
+        }
+        try:
+            for future in as_completed(futures):
+                provider = futures[future]
+                try:
+                    future.result()
+                except click.ClickException as e:
+                    errors[provider] = e.format_message()
+                except SystemExit:
+                    errors[provider] = "aborted, see the output above"
+                except Exception as e:
+                    errors[provider] = str(e)
+        except KeyboardInterrupt:
+            # only this thread sees the interrupt, stop the other providers' runs
+            docker.interrupt_tf_runners()
+            raise
+
+    if errors:
+        raise exception_with_msg(
+            f"terraform {tf_cmd.split()[0]} failed for {len(errors)} provider(s):\n"
+            + "\n".join(
+                f"[{provider}] {error}" for provider, error in sorted(errors.items())
+            )
+        )
+
+
+def targeted_addresses(provider, nodes, previous_nodes_config, nodes_config):
+    """
+    Returns the -target addresses that apply a change of `nodes` to a provider,
+    or None if the change needs a full apply: when the provider gains its first
+    or loses its last node (its module and registry come and go) or when a
+    setting feeding resources shared by all its nodes changes.
+    """
+    before = provider_nodes(previous_nodes_config, provider)
+    after = provider_nodes(nodes_config, provider)
+    if not before or not after:
+        return None
+    for setting, aggregate in SHARED_NODE_SETTINGS.get(provider, {}).items():
+        if shared_value(before, setting, aggregate) != shared_value(
+            after, setting, aggregate
+        ):
+            return None
+    targets = []
+    for node in nodes:
+        if node in before or node in after:
+            targets.extend(node_targets(provider, node))
+    return targets
+
+
+# node settings that feed resources shared by all nodes of a provider and how
+# terraform combines them, e.g. the AWS launch template fits the largest volume
+SHARED_NODE_SETTINGS = {"aws": {"volume": max}}
+
+
+def shared_value(nodes, setting, aggregate):
+    return aggregate(config.get(setting) or 0 for config in nodes.values())
+
+
+def node_targets(provider, node):
+    """
+    Addresses of every resource the provider's module creates per node, i.e.
+    resources with a for_each over var.nodes, for that node. Terraform adds the
+    shared resources they depend on to a targeted apply by itself.
+    """
+    targets = []
+    module_paths = glob.glob(os.path.join(CONFIG_PATH, provider, provider, "*.tf"))
+    for tf_path in sorted(module_paths):
+        with open(tf_path) as f:
+            content = f.read()
+        for match, block in tf_blocks(content, r'resource\s+"(\w+)"\s+"(\w+)"\s*\{'):
+            if re.search(r"^\s*for_each\s*=[^=]*?var\.nodes", block, re.M | re.S):
+                resource_type, name = match.groups()
+                targets.append(
+                    f'module.{provider}[0].{resource_type}.{name}["{node}"]'
+                )
+    return targets
+
+
+def tf_blocks(content, header_pattern):
+    """Yields (header match, block text) for each block whose header matches"""
+    for match in re.finditer(header_pattern, content):
+        depth, end = 1, match.end()
+        while depth and end < len(content):
+            depth += {"{": 1, "}": -1}.get(content[end], 0)
+            end += 1
+        yield match, content[match.start() : end]
+
+
+def init_terraform(provider, verbose):
+    """
+    Initializes a provider directory. Provider upgrades are only checked for when
+    the provider requirements changed since the last upgrade or the lockfile
+    doesn't pin every required provider, otherwise `init` installs the locked
+    versions straight from the shared plugin cache.
+    """
+    requirements, sources = provider_requirements(provider)
+    maybe_create(TF_INIT_PATH)
+    inits = load_config(TF_INIT_PATH)
+    if inits.get(provider) == requirements and sources <= locked_providers(provider):
+        terraform("init", verbose, provider)
+        return
+    terraform("init -upgrade", verbose, provider)
+    inits = load_config(TF_INIT_PATH)
+    inits[provider] = requirements
+    store_config(TF_INIT_PATH, inits)
+
+
+def provider_requirements(provider):
+    """
+    Returns a hash of every required_providers block in a provider directory
+    (including its modules) and the set of provider sources they require.
+    """
+    blocks = []
+    tf_paths = glob.glob(
+        os.path.join(CONFIG_PATH, provider, "**", "*.tf"), recursive=True
+    )
+    for tf_path in sorted(tf_paths):
+        with open(tf_path) as f:
+            content = f.read()
+        for _, block in tf_blocks(content, r"required_providers\s*\{"):
+            blocks.append(" ".join(block.split()))
+    sources = set()
+    for block in blocks:
+        sources.update(re.findall(r'source\s*=\s*"([^"]+)"', block))
+    digest = hashlib.sha256("\n".join(blocks).encode()).hexdigest()
+    return digest, sources
+
+
+def locked_providers(provider):
+    lockfile_path = os.path.join(CONFIG_PATH, provider, ".terraform.lock.hcl")
+    if not os.path.exists(lockfile_path):
+        return set()
+    with open(lockfile_path) as f:
+        return set(
+            re.findall(r'provider\s+"(?:registry\.terraform\.io/)?([^"]+)"', f.read())
+        )
 
 
 def create_azure_registry(provider, provider_keys, verbose):
     """Creates a registry for azure"""
-    terraform("init -upgrade", verbose, provider)
+    init_terraform(provider, verbose)
+    sync_provider_nodes()
     terraform(
         'apply -target="azurerm_container_registry.registry[0]" -target="azurerm_resource_group.acr_rg[0]" -auto-approve ',
         verbose,
         "azure",
         env_vars=provider_keys,
-        inputs={"node_config_file": "../nodes.json"},
+        inputs={"node_config_file": PROVIDER_NODES_FILE},
     )
     res = terraform("output -json acr_repo_details", True, provider).decode("utf-8")
     return json.loads(res)
@@ -59,18 +381,19 @@ def create_azure_registry(provider, provider_keys, verbose):
 
 def create_gcp_registry(provider, verbose):
     """Creates a registry for GCP"""
-    terraform("init -upgrade", verbose, provider)
+    init_terraform(provider, verbose)
+    sync_provider_nodes()
     terraform(
         'apply -target="google_project_service.cloud_resource_manager" -auto-approve ',
         verbose,
         "gcp",
-        inputs={"node_config_file": "../nodes.json"},
+        inputs={"node_config_file": PROVIDER_NODES_FILE},
     )
     terraform(
         'apply -target="google_artifact_registry_repository.registry[0]" -auto-approve ',
         verbose,
         "gcp",
-        inputs={"node_config_file": "../nodes.json"},
+        inputs={"node_config_file": PROVIDER_NODES_FILE},
     )
     res = terraform("output -json artifact_registry_details", True, provider).decode(
         "utf-8"
@@ -11,9 +11,9 @@ variable "az_count" {
 }
 
 variable "node_config_file" {
-  description = "Path to the json file used to configure nodes"
+  description = "Path to the json file used to configure this provider's nodes"
   type        = string
-  default     = "../nodes.json"
+  default     = "nodes.json"
 }
 
 variable "node_container_port" {
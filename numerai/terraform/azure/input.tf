@@ -7,9 +7,9 @@ variable "az_resource_group_location" {
 
 # Load all nodes' config from the nodes.json file
 variable "node_config_file" {
-  description = "Path to the json file used to configure nodes"
+  description = "Path to the json file used to configure this provider's nodes"
   type        = string
-  default     = "../nodes.json"
+  default     = "nodes.json"
 }
 
 variable "node_container_port" {
@@ -5,7 +5,7 @@ variable "region" {
 }
 
 variable "node_config_file" {
-  description = "Path to the json file used to configure nodes"
+  description = "Path to the json file used to configure this provider's nodes"
   type        = string
-  default     = "../nodes.json"
+  default     = "nodes.json"
 }
@@ -0,0 +1,73 @@
+"""
+Benchmark: `numerai --help` with the network unavailable.
+
+Runs the CLI's help in fresh interpreters with every socket call failing and
+an empty home directory, so there is no cached tournament list either. Fails
+if the CLI touches the network while starting up or if the median run takes
+longer than the budget.
+
+    python scripts/benchmarks/help_offline.py [budget seconds]
+"""
+
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+RUNS = 5
+BUDGET_SECONDS = 1.5
+COMMANDS = [["--help"], ["node", "--help"], ["list-constants"]]
+
+# runs in the child: any network access raises before the CLI starts
+OFFLINE_CLI = """
+import socket, sys
+
+def offline(*args, **kwargs):
+    raise OSError("network access while starting the CLI")
+
+socket.socket.connect = offline
+socket.socket.connect_ex = offline
+socket.getaddrinfo = offline
+socket.create_connection = offline
+
+from numerai import main
+sys.argv = ["numerai"] + sys.argv[1:]
+main()
+"""
+
+
+def time_command(args, home):
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", OFFLINE_CLI, *args],
+        env={"HOME": home, "USERPROFILE": home, "PATH": ""},
+        capture_output=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        sys.exit(
+            f"numerai {' '.join(args)} failed offline:\n{result.stdout}{result.stderr}"
+        )
+    return elapsed
+
+
+def main():
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else BUDGET_SECONDS
+    failed = False
+    with tempfile.TemporaryDirectory() as home:
+        for args in COMMANDS:
+            timings = [time_command(args, home) for _ in range(RUNS)]
+            median = statistics.median(timings)
+            print(
+                f"numerai {' '.join(args)}: median {median:.3f}s, "
+                f"max {max(timings):.3f}s over {RUNS} runs (budget {budget:.1f}s)"
+            )
+            failed = failed or median > budget
+    if failed:
+        sys.exit("CLI startup exceeded its budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Benchmark: CPU used by the streaming runner while a command is quiet.
+
+Runs a command through util.process.run_streaming that prints a line, stays
+silent for a while, then prints another, and measures the CPU time this
+process spent meanwhile. A runner that blocks on its pipes uses next to none,
+a polling loop burns a core for the whole command.
+
+    python scripts/benchmarks/idle_cpu.py [quiet seconds]
+"""
+
+import sys
+import time
+
+from numerai.cli.util.process import run_streaming
+
+QUIET_SECONDS = 5
+# share of one core the runner may use while the command is quiet
+BUDGET_CPU_SHARE = 0.02
+
+
+def main():
+    quiet_seconds = float(sys.argv[1]) if len(sys.argv) > 1 else QUIET_SECONDS
+    lines = []
+
+    def on_line(stream_name, line):
+        lines.append((stream_name, line))
+
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    returncode, stdout, stderr = run_streaming(
+        f"echo started; sleep {quiet_seconds}; echo done >&2", on_line=on_line
+    )
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+    stdout.close()
+    stderr.close()
+
+    if returncode != 0 or lines != [("stdout", b"started\n"), ("stderr", b"done\n")]:
+        sys.exit(f"unexpected command result: {returncode}, {lines}")
+    print(
+        f"{cpu:.3f}s of CPU over {wall:.1f}s of wall time "
+        f"({cpu / wall:.1%} of a core, budget {BUDGET_CPU_SHARE:.0%})"
+    )
+    if cpu / wall > BUDGET_CPU_SHARE:
+        sys.exit("the streaming runner is busy while the command is quiet")
+
+
+if __name__ == "__main__":
+    main()
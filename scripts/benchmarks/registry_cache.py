@@ -0,0 +1,120 @@
+"""
+Test: `deploy --registry-cache` builds reuse layers cached in the registry.
+
+Builds a small node with util.docker.build(registry_cache=True) against a
+local registry, then throws away the buildx builder and the image, as on a
+fresh machine, and builds again. Fails unless the second build takes the
+pip install layer from the registry cache. Needs docker with buildx.
+
+    python scripts/benchmarks/registry_cache.py
+"""
+
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+# the CLI reads its config from the home directory when it is imported
+home = tempfile.mkdtemp()
+os.environ["HOME"] = home
+
+from numerai.cli.constants import BUILDX_BUILDER, CONFIG_PATH, KEYS_PATH
+from numerai.cli.util import docker
+
+REGISTRY = "localhost:5000"
+REGISTRY_CONTAINER = "numerai-cli-test-registry"
+NODE = "cache-test"
+
+DOCKERFILE = """FROM python:3.12-slim
+ARG SRC_PATH
+ADD $SRC_PATH/requirements.txt .
+RUN pip install -r requirements.txt --no-cache-dir
+ADD $SRC_PATH .
+CMD [ "python", "./predict.py" ]
+"""
+
+
+def sh(cmd, check=True):
+    return subprocess.run(cmd, shell=True, check=check, capture_output=True)
+
+
+def create_builder():
+    # the builder runs in its own container, on the host network it can reach the registry
+    sh(f"docker buildx rm {BUILDX_BUILDER}", check=False)
+    sh(
+        f"docker buildx create --name {BUILDX_BUILDER} "
+        f"--driver docker-container --driver-opt network=host"
+    )
+
+
+def timed_build(node_config):
+    """Builds the node and returns (seconds, build output)"""
+    outputs = []
+    execute = docker.execute
+
+    def recording_execute(command, verbose, censor_substr=None):
+        stdout, stderr = execute(command, verbose, censor_substr)
+        outputs.append(stdout + stderr)
+        return stdout, stderr
+
+    docker.execute = recording_execute
+    start = time.time()
+    try:
+        docker.build(node_config, NODE, verbose=False, registry_cache=True)
+    finally:
+        docker.execute = execute
+    return time.time() - start, outputs[-1].decode(errors="replace")
+
+
+def pip_install_cached(output):
+    step = re.search(r"^#(\d+) \[[^\]]*\] RUN pip install", output, re.MULTILINE)
+    if step is None:
+        sys.exit(f"pip install step not found in the build output:\n{output}")
+    return re.search(rf"^#{step.group(1)} CACHED", output, re.MULTILINE) is not None
+
+
+def main():
+    os.makedirs(CONFIG_PATH, exist_ok=True)
+    with open(KEYS_PATH, "w") as f:
+        json.dump(
+            {"numerai": {"NUMERAI_PUBLIC_ID": "cache-id", "NUMERAI_SECRET_KEY": "cache-key"}},
+            f,
+        )
+    context = tempfile.mkdtemp()
+    node_path = os.path.join(context, NODE)
+    os.makedirs(node_path)
+    with open(os.path.join(node_path, "Dockerfile"), "w") as f:
+        f.write(DOCKERFILE)
+    with open(os.path.join(node_path, "requirements.txt"), "w") as f:
+        # unique per run, so the first build can't hit a cache left by another run
+        f.write(f"# {time.time()}\nsix==1.16.0\n")
+    with open(os.path.join(node_path, "predict.py"), "w") as f:
+        f.write("print('hello')\n")
+    os.chdir(context)
+
+    image = f"{REGISTRY}/{NODE}:latest"
+    node_config = {"docker_repo": image, "path": node_path, "model_id": "cache-test"}
+    sh(f"docker run -d --rm -p 5000:5000 --name {REGISTRY_CONTAINER} registry:2")
+    try:
+        create_builder()
+        cold, output = timed_build(node_config)
+        if pip_install_cached(output):
+            sys.exit("the first build was already cached, the test can't tell anything")
+
+        # a fresh machine: no builder cache and no local image
+        create_builder()
+        sh(f"docker image rm {image}")
+        warm, output = timed_build(node_config)
+        print(f"cold build {cold:.1f}s, warm build from the registry cache {warm:.1f}s")
+        if not pip_install_cached(output):
+            sys.exit(f"the second build didn't use the registry cache:\n{output}")
+    finally:
+        sh(f"docker buildx rm {BUILDX_BUILDER}", check=False)
+        sh(f"docker stop {REGISTRY_CONTAINER}", check=False)
+
+
+if __name__ == "__main__":
+    main()
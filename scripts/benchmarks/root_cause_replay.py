@@ -0,0 +1,88 @@
+"""
+Benchmark: classifying command output with RootCauseScanner.
+
+Replays logs line by line through the scanner the way `execute` feeds it and
+reports the throughput. Recorded logs can be passed as `stdout:<path>` or
+`stderr:<path>`. Without any, a log shaped like a `docker build` followed by
+a `terraform apply` is generated. A fatal signature is appended at the end
+and must be found. Fails if the scanner is slower than the budget.
+
+    python scripts/benchmarks/root_cause_replay.py [stdout:<path> stderr:<path> ...]
+"""
+
+import sys
+import time
+
+from numerai.cli.util.debug import RootCauseScanner
+
+GENERATED_MB = 64
+# lower bound on classified output per second, far above what commands print
+BUDGET_MB_PER_SECOND = 10
+
+DOCKER_BUILD_LINES = [
+    ("stderr", "#{step} [ 4/6] RUN pip install -r requirements.txt --no-cache-dir\n"),
+    ("stderr", "#{step} {seconds:.3f} Collecting pandas==2.2.{step} (from -r requirements.txt (line 3))\n"),
+    ("stderr", "#{step} {seconds:.3f}   Downloading pandas-2.2.{step}-cp311-cp311-manylinux_2_17_x86_64.whl (13.0 MB)\n"),
+    ("stderr", "#{step} {seconds:.3f}      ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━ 13.0/13.0 MB 96.1 MB/s eta 0:00:00\n"),
+    ("stderr", "#{step} {seconds:.3f} Requirement already satisfied: numpy>=1.23.2 in /usr/local/lib/python3.11/site-packages\n"),
+    ("stderr", "#{step} DONE {seconds:.1f}s\n"),
+]
+TERRAFORM_LINES = [
+    ("stdout", "module.aws.aws_ecs_task_definition.node[\"model-{step}\"]: Refreshing state... [id=model-{step}]\n"),
+    ("stdout", "  # module.aws.aws_lambda_function.submission[\"model-{step}\"] will be updated in-place\n"),
+    ("stdout", "      ~ source_code_hash = \"Zm9vYmFy{step}\" -> (known after apply)\n"),
+    ("stdout", "module.aws.aws_lambda_function.submission[\"model-{step}\"]: Still modifying... [{seconds:.0f}s elapsed]\n"),
+    ("stdout", "Apply complete! Resources: 0 added, {step} changed, 0 destroyed.\n"),
+]
+FATAL_LINE = ("stderr", "subprocess.CalledProcessError: returned non-zero exit status 137\n")
+
+
+def generated_log(size_mb):
+    lines = []
+    size = 0
+    step = 0
+    while size < size_mb * 1024 * 1024:
+        step += 1
+        for stream_name, template in DOCKER_BUILD_LINES + TERRAFORM_LINES:
+            line = template.format(step=step, seconds=step * 0.137).encode()
+            lines.append((stream_name, line))
+            size += len(line)
+    return lines
+
+
+def recorded_log(specs):
+    lines = []
+    for spec in specs:
+        stream_name, _, path = spec.partition(":")
+        if stream_name not in ("stdout", "stderr"):
+            sys.exit(f"expected stdout:<path> or stderr:<path>, got {spec}")
+        with open(path, "rb") as f:
+            lines.extend((stream_name, line) for line in f)
+    return lines
+
+
+def main():
+    lines = recorded_log(sys.argv[1:]) if sys.argv[1:] else generated_log(GENERATED_MB)
+    lines.append((FATAL_LINE[0], FATAL_LINE[1].encode()))
+    size_mb = sum(len(line) for _, line in lines) / 1024 / 1024
+
+    scanner = RootCauseScanner()
+    start = time.perf_counter()
+    for stream_name, line in lines:
+        scanner.feed(stream_name, line)
+    elapsed = time.perf_counter() - start
+
+    throughput = size_mb / elapsed
+    print(
+        f"classified {size_mb:.1f} MB in {len(lines)} lines in {elapsed:.2f}s: "
+        f"{throughput:.1f} MB/s, {elapsed / len(lines) * 1e6:.2f}us per line "
+        f"(budget {BUDGET_MB_PER_SECOND} MB/s), found {sorted(scanner.found)}"
+    )
+    if not scanner.fatal or "out_of_memory" not in scanner.found:
+        sys.exit("the fatal signature at the end of the log was missed")
+    if throughput < BUDGET_MB_PER_SECOND:
+        sys.exit("classifying output is slower than the budget")
+
+
+if __name__ == "__main__":
+    main()